@@ -0,0 +1,246 @@
+import math
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
+from typing import Callable, ContextManager, Deque, Dict, List, Optional
+
+from app import json_store, metrics
+from app.config import get_settings
+
+settings = get_settings()
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request can't be admitted now; retry after `retry_after` seconds."""
+
+    def __init__(self, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """
+    An admitted unit of work. Use as a context manager around the work:
+    entering waits for an execution slot, exiting releases it. Or hand
+    the work to submit(), which queues for a slot without blocking. A
+    ticket that will never run must be cancelled (or closed) to refund
+    its points.
+    """
+
+    def __init__(self, controller: "AdmissionController", user_id: int, cost: int):
+        self.controller = controller
+        self.user_id = user_id
+        self.cost = cost
+        self.granted = False
+        self.started_at = 0.0
+        self.done = False
+        self.on_grant: Optional[Callable[[], None]] = None
+
+    def __enter__(self) -> "Ticket":
+        self.controller._acquire(self)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.controller._release(self)
+
+    def run(self, fn: Callable, *args):
+        with self:
+            return fn(*args)
+
+    def submit(self, executor: Executor, fn: Callable, *args) -> Future:
+        """
+        Queue for a slot now and run fn(*args) on executor once granted.
+        The executor only ever receives granted work, so its own FIFO
+        queue can't reorder users ahead of the round-robin dispatch.
+        """
+        future = Future()
+
+        def run():
+            try:
+                result = fn(*args)
+            except BaseException as e:
+                self.controller._release(self)
+                future.set_exception(e)
+            else:
+                self.controller._release(self)
+                future.set_result(result)
+
+        self.on_grant = lambda: executor.submit(run)
+        self.controller._enqueue(self)
+        return future
+
+    def cancel(self) -> None:
+        self.controller._cancel(self)
+
+    def close(self) -> None:
+        """Cancel the ticket if it was admitted but never entered; otherwise no-op."""
+        if not self.granted and not self.done:
+            self.cancel()
+
+
+class AdmissionController:
+    """
+    Bounded admission with fair scheduling for expensive work.
+
+    - At most max_running tickets execute at once; at most max_queued
+      more may wait. Beyond that, admit() rejects.
+    - Each user may hold at most user_max_concurrent tickets (running or
+      waiting) and spends points from a token bucket holding user_budget
+      points that refills completely over refill_seconds.
+    - Free slots go to waiting users round-robin, so one user's backlog
+      doesn't delay everyone else's next request.
+
+    Slots, queue and concurrency limits apply to this process. The token
+    buckets live wherever `buckets` keeps them: a context manager yielding
+    a {user_key: [tokens, updated_at]} dict. By default that is this
+    controller's memory; json_store.admission_buckets shares them across
+    worker processes (with a wall clock, since timestamps cross processes).
+    """
+
+    def __init__(
+        self,
+        max_running: int,
+        max_queued: int,
+        user_max_concurrent: int,
+        user_budget: int,
+        refill_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+        buckets: Optional[Callable[[], ContextManager[Dict[str, List[float]]]]] = None,
+    ):
+        self.max_running = max_running
+        self.max_queued = max_queued
+        self.user_max_concurrent = user_max_concurrent
+        self.user_budget = user_budget
+        self.refill_rate = user_budget / refill_seconds
+        self._clock = clock
+
+        self._cond = threading.Condition()
+        self._admitted = 0
+        self._running = 0
+        self._user_active: Counter = Counter()
+        self._waiting: Dict[int, Deque[Ticket]] = {}
+        self._turns: Deque[int] = deque()
+        self._local_buckets: Dict[str, List[float]] = {}
+        self._buckets = buckets or self._memory_buckets
+        self._service_seconds = 1.0  # moving average of run time, for Retry-After
+
+    # ─────────────────────────────────────
+    # Admission
+    # ─────────────────────────────────────
+    def admit(self, user_id: int, cost: int) -> Ticket:
+        """Admit a request costing `cost` points or raise AdmissionRejected."""
+        if cost > self.user_budget:
+            raise ValueError(f"Request costs {cost} points, above the per-user budget of {self.user_budget}")
+
+        with self._cond:
+            if self._admitted >= self.max_running + self.max_queued:
+                waiting = self._admitted - self._running
+                self._reject("queue_full", "Server is busy, please retry",
+                             self._service_seconds * (waiting + 1) / self.max_running)
+
+            if self._user_active[user_id] >= self.user_max_concurrent:
+                self._reject("user_concurrency",
+                             f"At most {self.user_max_concurrent} concurrent requests per user",
+                             self._service_seconds)
+
+            now = self._clock()
+            with self._buckets() as buckets:
+                tokens, last = buckets.get(str(user_id), (float(self.user_budget), now))
+                tokens = min(float(self.user_budget), tokens + max(0.0, now - last) * self.refill_rate)
+                if tokens < cost:
+                    buckets[str(user_id)] = [tokens, now]
+                    self._reject("user_budget", "Point budget exhausted, please retry",
+                                 (cost - tokens) / self.refill_rate)
+                buckets[str(user_id)] = [tokens - cost, now]
+
+            self._admitted += 1
+            self._user_active[user_id] += 1
+            metrics.increment("admission_admitted")
+            self._publish()
+            return Ticket(self, user_id, cost)
+
+    @contextmanager
+    def _memory_buckets(self):
+        yield self._local_buckets
+
+    def _reject(self, reason: str, detail: str, retry_after: float) -> None:
+        metrics.increment(f"admission_rejected_{reason}")
+        raise AdmissionRejected(detail, max(1, math.ceil(retry_after)))
+
+    # ─────────────────────────────────────
+    # Scheduling
+    # ─────────────────────────────────────
+    def _acquire(self, ticket: Ticket) -> None:
+        with self._cond:
+            self._enqueue(ticket)
+            while not ticket.granted:
+                self._cond.wait()
+
+    def _enqueue(self, ticket: Ticket) -> None:
+        with self._cond:
+            queue = self._waiting.setdefault(ticket.user_id, deque())
+            queue.append(ticket)
+            if ticket.user_id not in self._turns:
+                self._turns.append(ticket.user_id)
+            self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Hand free slots to waiting users in round-robin order."""
+        while self._running < self.max_running and self._turns:
+            user_id = self._turns.popleft()
+            queue = self._waiting[user_id]
+            ticket = queue.popleft()
+            ticket.granted = True
+            ticket.started_at = self._clock()
+            self._running += 1
+            if queue:
+                self._turns.append(user_id)
+            else:
+                del self._waiting[user_id]
+            if ticket.on_grant is not None:
+                ticket.on_grant()
+        self._publish()
+        self._cond.notify_all()
+
+    def _release(self, ticket: Ticket) -> None:
+        with self._cond:
+            elapsed = self._clock() - ticket.started_at
+            self._service_seconds = 0.8 * self._service_seconds + 0.2 * elapsed
+            self._running -= 1
+            self._finish(ticket)
+            self._dispatch()
+
+    def _cancel(self, ticket: Ticket) -> None:
+        with self._cond:
+            if ticket.done:
+                return
+            with self._buckets() as buckets:
+                tokens, last = buckets.get(str(ticket.user_id), (0.0, self._clock()))
+                buckets[str(ticket.user_id)] = [min(float(self.user_budget), tokens + ticket.cost), last]
+            self._finish(ticket)
+            self._publish()
+
+    def _finish(self, ticket: Ticket) -> None:
+        ticket.done = True
+        self._admitted -= 1
+        self._user_active[ticket.user_id] -= 1
+        if not self._user_active[ticket.user_id]:
+            del self._user_active[ticket.user_id]
+
+    def _publish(self) -> None:
+        metrics.set_gauge("admission_running", self._running)
+        metrics.set_gauge("admission_queued", self._admitted - self._running)
+
+
+controller = AdmissionController(
+    max_running=settings.ADMISSION_MAX_RUNNING,
+    max_queued=settings.ADMISSION_MAX_QUEUED,
+    user_max_concurrent=settings.ADMISSION_USER_MAX_CONCURRENT,
+    user_budget=settings.ADMISSION_USER_POINT_BUDGET,
+    refill_seconds=settings.ADMISSION_USER_POINT_REFILL_SECONDS,
+    clock=time.time,
+    buckets=json_store.admission_buckets,
+)
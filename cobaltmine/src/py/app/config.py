@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Dict
 
 class Settings(BaseSettings):
     SECRET_KEY: str = "SECRET_KEY"
@@ -7,6 +8,27 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
     DATABASE_URL: str = "sqlite:///./users.db"
+    STRESS_MAX_PATHS: int = 100000
+    STRESS_MAX_WORKERS: int = 0  # 0 = one per CPU
+    STRESS_CHUNK_BYTES: int = 64 * 1024 * 1024
+    SURFACE_WORKERS: int = 4
+    SURFACE_GRID_STEPS: int = 10
+    SURFACE_LEASE_SECONDS: int = 300
+    SURFACE_POLL_WAIT_SECONDS: float = 1.0  # longest a poll waits on a running computation
+    SURFACE_CACHE_SIZE: int = 256
+    SURFACE_RESOLUTIONS: Dict[str, float] = {}  # per-metric overrides of the snapping grid
+    SURFACE_TILE_SIZE: int = 8
+    SURFACE_TILE_CACHE_SIZE: int = 4096
+    # Running, queued and per-user concurrent limits are per worker process;
+    # the point budget is shared by all workers (data/admission_buckets.json)
+    ADMISSION_MAX_RUNNING: int = 4
+    ADMISSION_MAX_QUEUED: int = 32
+    ADMISSION_USER_MAX_CONCURRENT: int = 4
+    ADMISSION_USER_POINT_BUDGET: int = 1_000_000_000  # model evaluations
+    ADMISSION_USER_POINT_REFILL_SECONDS: int = 600
+    VERSION_CHECKPOINT_INTERVAL: int = 10
+    VERSION_MAX_PER_RECORD: int = 100
+    VERSION_RETENTION_DAYS: int = 0  # 0 = keep regardless of age
     
     class Config:
         env_file = ".env"
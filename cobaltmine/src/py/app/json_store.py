@@ -1,8 +1,17 @@
 import json
 import os
 import copy
+import fcntl
 import threading
-from typing import List, Optional
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from app import versioning
+from app.config import get_settings
+from app.portfolio_analytics import PortfolioView
+
+settings = get_settings()
 
 # ─────────────────────────────────────
 # Resolve paths to data files
@@ -11,10 +20,23 @@ from typing import List, Optional
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 PORTFOLIO_FILE = os.path.join(BASE_DIR, "data", "credit_ratings.json")
 SCENARIOS_FILE = os.path.join(BASE_DIR, "data", "scenarios.json")
+SCENARIO_SURFACES_FILE = os.path.join(BASE_DIR, "data", "scenario_surfaces.json")
+PORTFOLIO_VERSIONS_FILE = os.path.join(BASE_DIR, "data", "credit_rating_versions.json")
+SCENARIO_VERSIONS_FILE = os.path.join(BASE_DIR, "data", "scenario_versions.json")
+ADMISSION_BUCKETS_FILE = os.path.join(BASE_DIR, "data", "admission_buckets.json")
 
 # Separate locks for each file to avoid blocking unrelated operations
 _portfolio_lock = threading.Lock()
 _scenarios_lock = threading.Lock()
+_surfaces_lock = threading.Lock()
+_admission_lock = threading.Lock()
+
+# Columnar analytics views, built lazily per user and kept in sync
+# by the portfolio write functions below (guarded by _portfolio_lock).
+# Other worker processes write the same file, so the views also record
+# the file's stamp as of their last sync and are rebuilt when it moves.
+_portfolio_views: Dict[str, PortfolioView] = {}
+_portfolio_views_stamp: Optional[Tuple[int, int]] = None
 
 
 # ─────────────────────────────────────
@@ -35,9 +57,51 @@ def _write_file(filepath: str, data: dict) -> None:
         json.dump(data, f, indent=4)
 
 
+@contextmanager
+def _locked_file(filepath: str, lock: threading.Lock):
+    """Hold `lock` and an exclusive flock on filepath's sidecar lock file."""
+    with lock:
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        with open(filepath + ".lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _file_stamp(filepath: str) -> Optional[Tuple[int, int]]:
+    """(mtime_ns, size) of a file, or None if it doesn't exist."""
+    try:
+        stat = os.stat(filepath)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
 # ─────────────────────────────────────
 # Portfolio (credit_ratings.json)
 # ─────────────────────────────────────
+def _sync_portfolio_views() -> None:
+    """
+    Drop every analytics view if the portfolio file changed since the
+    views were last in sync (i.e. another process wrote it). Call with
+    _portfolio_lock held, before reading the file.
+    """
+    global _portfolio_views_stamp
+    stamp = _file_stamp(PORTFOLIO_FILE)
+    if stamp != _portfolio_views_stamp:
+        _portfolio_views.clear()
+        _portfolio_views_stamp = stamp
+
+
+def _write_portfolio(data: dict) -> None:
+    """Write the portfolio file and mark the (already updated) views in sync with it."""
+    global _portfolio_views_stamp
+    _write_file(PORTFOLIO_FILE, data)
+    _portfolio_views_stamp = _file_stamp(PORTFOLIO_FILE)
+
+
 def get_credit_ratings(user_id: int) -> List[dict]:
     """Fetch all credit ratings for a given user."""
     with _portfolio_lock:
@@ -57,6 +121,7 @@ def get_credit_rating_by_id(user_id: int, computation_id: str) -> Optional[dict]
 def add_credit_rating(user_id: int, rating: dict) -> dict:
     """Add a new credit rating. Raises ValueError on duplicate ID."""
     with _portfolio_lock:
+        _sync_portfolio_views()
         data = _read_file(PORTFOLIO_FILE)
         user_key = str(user_id)
 
@@ -68,21 +133,38 @@ def add_credit_rating(user_id: int, rating: dict) -> dict:
                 raise ValueError(f"Computation ID '{rating['id']}' already exists")
 
         data["users"][user_key].append(rating)
-        _write_file(PORTFOLIO_FILE, data)
+        _write_portfolio(data)
+
+        view = _portfolio_views.get(user_key)
+        if view is not None:
+            view.add(rating)
         return rating
 
 
 def update_credit_rating(user_id: int, computation_id: str, updated_fields: dict) -> Optional[dict]:
-    """Update an existing credit rating. Returns updated record or None."""
+    """
+    Update an existing credit rating. Returns updated record or None.
+    Raises ValueError if "id" is changed to one that already exists.
+    """
     with _portfolio_lock:
+        _sync_portfolio_views()
         data = _read_file(PORTFOLIO_FILE)
         user_key = str(user_id)
         ratings = data.get("users", {}).get(user_key, [])
 
         for i, rating in enumerate(ratings):
             if rating["id"] == computation_id:
+                new_id = updated_fields.get("id", computation_id)
+                if new_id != computation_id and any(r["id"] == new_id for r in ratings):
+                    raise ValueError(f"Computation ID '{new_id}' already exists")
+                before = copy.deepcopy(rating)
                 ratings[i].update(updated_fields)
-                _write_file(PORTFOLIO_FILE, data)
+                _write_portfolio(data)
+                _record_version(PORTFOLIO_VERSIONS_FILE, user_key, before, ratings[i])
+
+                view = _portfolio_views.get(user_key)
+                if view is not None:
+                    view.update(computation_id, ratings[i])
                 return ratings[i]
 
         return None
@@ -91,6 +173,7 @@ def update_credit_rating(user_id: int, computation_id: str, updated_fields: dict
 def delete_credit_rating(user_id: int, computation_id: str) -> bool:
     """Delete a credit rating. Returns True if deleted, False if not found."""
     with _portfolio_lock:
+        _sync_portfolio_views()
         data = _read_file(PORTFOLIO_FILE)
         user_key = str(user_id)
         ratings = data.get("users", {}).get(user_key, [])
@@ -98,7 +181,12 @@ def delete_credit_rating(user_id: int, computation_id: str) -> bool:
         for i, rating in enumerate(ratings):
             if rating["id"] == computation_id:
                 ratings.pop(i)
-                _write_file(PORTFOLIO_FILE, data)
+                _write_portfolio(data)
+                _drop_versions(PORTFOLIO_VERSIONS_FILE, user_key, computation_id)
+
+                view = _portfolio_views.get(user_key)
+                if view is not None:
+                    view.remove(computation_id)
                 return True
 
         return False
@@ -107,6 +195,7 @@ def delete_credit_rating(user_id: int, computation_id: str) -> bool:
 def seed_portfolio_data(user_id: int) -> None:
     """Seeds demo portfolio data for a new user if they have no records."""
     with _portfolio_lock:
+        _sync_portfolio_views()
         data = _read_file(PORTFOLIO_FILE)
         user_key = str(user_id)
 
@@ -115,7 +204,40 @@ def seed_portfolio_data(user_id: int) -> None:
 
         demo_source = data.get("users", {}).get("1", [])
         data["users"][user_key] = copy.deepcopy(demo_source)
-        _write_file(PORTFOLIO_FILE, data)
+        _write_portfolio(data)
+
+        # Rebuilt from the seeded records on next access
+        _portfolio_views.pop(user_key, None)
+
+
+def preload_portfolio_views() -> int:
+    """
+    Build the analytics view for every user with credit ratings.
+    Returns the number of credit ratings indexed.
+    """
+    with _portfolio_lock:
+        _sync_portfolio_views()
+        portfolio = _read_file(PORTFOLIO_FILE)
+        for user_key, ratings in portfolio.get("users", {}).items():
+            if user_key not in _portfolio_views:
+                _portfolio_views[user_key] = PortfolioView(ratings)
+        return sum(len(r) for r in portfolio.get("users", {}).values())
+
+
+def get_portfolio_view(user_id: int) -> PortfolioView:
+    """
+    Columnar analytics view of a user's credit ratings, built on first use
+    and rebuilt after another process writes the portfolio file.
+    """
+    with _portfolio_lock:
+        _sync_portfolio_views()
+        user_key = str(user_id)
+        view = _portfolio_views.get(user_key)
+        if view is None:
+            data = _read_file(PORTFOLIO_FILE)
+            view = PortfolioView(data.get("users", {}).get(user_key, []))
+            _portfolio_views[user_key] = view
+        return view
 
 
 # ─────────────────────────────────────
@@ -142,6 +264,7 @@ def update_scenario(user_id: int, computation_id: str, updated_fields: dict) ->
     Update an existing scenario by computation_id.
     Only updates fields present in updated_fields.
     Returns updated record or None if not found.
+    Raises ValueError if "id" is changed to one that already exists.
     """
     with _scenarios_lock:
         data = _read_file(SCENARIOS_FILE)
@@ -150,8 +273,13 @@ def update_scenario(user_id: int, computation_id: str, updated_fields: dict) ->
 
         for i, scenario in enumerate(scenarios):
             if scenario["id"] == computation_id:
+                new_id = updated_fields.get("id", computation_id)
+                if new_id != computation_id and any(s["id"] == new_id for s in scenarios):
+                    raise ValueError(f"Computation ID '{new_id}' already exists")
+                before = copy.deepcopy(scenario)
                 scenarios[i].update(updated_fields)
                 _write_file(SCENARIOS_FILE, data)
+                _record_version(SCENARIO_VERSIONS_FILE, user_key, before, scenarios[i])
                 return scenarios[i]
 
         return
@@ -169,3 +297,190 @@ def seed_scenarios_data(user_id: int) -> None:
         demo_source = data.get("users", {}).get("1", [])
         data["users"][user_key] = copy.deepcopy(demo_source)
         _write_file(SCENARIOS_FILE, data)
+
+
+# ─────────────────────────────────────
+# Version history (credit_rating_versions.json, scenario_versions.json)
+# Field-level deltas with periodic checkpoints, see app/versioning.py.
+# Histories are keyed by the record's current id, so an update that
+# renames a record moves its history along with it.
+# Called with the owning store's lock held.
+# ─────────────────────────────────────
+def _record_version(versions_file: str, user_key: str, before: dict, after: dict) -> None:
+    data = _read_file(versions_file)
+    histories = data["users"].setdefault(user_key, {})
+    history = histories.pop(before["id"], {})
+    histories[after["id"]] = history
+    changed = versioning.record_change(
+        history, before, after,
+        checkpoint_interval=settings.VERSION_CHECKPOINT_INTERVAL,
+        max_versions=settings.VERSION_MAX_PER_RECORD,
+        retention_days=settings.VERSION_RETENTION_DAYS,
+    )
+    if changed:
+        _write_file(versions_file, data)
+
+
+def _drop_versions(versions_file: str, user_key: str, computation_id: str) -> None:
+    data = _read_file(versions_file)
+    if data["users"].get(user_key, {}).pop(computation_id, None) is not None:
+        _write_file(versions_file, data)
+
+
+def _history(versions_file: str, user_key: str, computation_id: str, current: dict) -> dict:
+    """Stored history, or a single version 1 for a record never updated."""
+    data = _read_file(versions_file)
+    history = data["users"].get(user_key, {}).get(computation_id)
+    if not history:
+        history = {"versions": [{"version": 1, "timestamp": None, "type": "checkpoint", "record": current}]}
+    return history
+
+
+def _list_versions(lock, data_file, versions_file, user_id, computation_id) -> Optional[List[dict]]:
+    with lock:
+        user_key = str(user_id)
+        records = _read_file(data_file).get("users", {}).get(user_key, [])
+        current = next((r for r in records if r["id"] == computation_id), None)
+        if current is None:
+            return None
+        return versioning.summarize(_history(versions_file, user_key, computation_id, current))
+
+
+def _get_version(lock, data_file, versions_file, user_id, computation_id, version) -> Optional[dict]:
+    with lock:
+        user_key = str(user_id)
+        records = _read_file(data_file).get("users", {}).get(user_key, [])
+        current = next((r for r in records if r["id"] == computation_id), None)
+        if current is None:
+            return None
+        return versioning.reconstruct(_history(versions_file, user_key, computation_id, current), version)
+
+
+def get_credit_rating_versions(user_id: int, computation_id: str) -> Optional[List[dict]]:
+    """Version list for a credit rating, or None if the rating doesn't exist."""
+    return _list_versions(_portfolio_lock, PORTFOLIO_FILE, PORTFOLIO_VERSIONS_FILE, user_id, computation_id)
+
+
+def get_credit_rating_version(user_id: int, computation_id: str, version: int) -> Optional[dict]:
+    """A credit rating as of `version`, or None if unknown or pruned."""
+    return _get_version(_portfolio_lock, PORTFOLIO_FILE, PORTFOLIO_VERSIONS_FILE, user_id, computation_id, version)
+
+
+def get_scenario_versions(user_id: int, computation_id: str) -> Optional[List[dict]]:
+    """Version list for a scenario, or None if the scenario doesn't exist."""
+    return _list_versions(_scenarios_lock, SCENARIOS_FILE, SCENARIO_VERSIONS_FILE, user_id, computation_id)
+
+
+def get_scenario_version(user_id: int, computation_id: str, version: int) -> Optional[dict]:
+    """A scenario as of `version`, or None if unknown or pruned."""
+    return _get_version(_scenarios_lock, SCENARIOS_FILE, SCENARIO_VERSIONS_FILE, user_id, computation_id, version)
+
+# ─────────────────────────────────────
+# Scenario surfaces (scenario_surfaces.json)
+# Shared by every worker process, so writes also take an
+# exclusive flock on a sidecar lock file.
+# ─────────────────────────────────────
+def _surfaces_file_lock():
+    return _locked_file(SCENARIO_SURFACES_FILE, _surfaces_lock)
+
+
+def _read_surfaces() -> dict:
+    if not os.path.exists(SCENARIO_SURFACES_FILE):
+        return {"scenario_surfaces": {}}
+    with open(SCENARIO_SURFACES_FILE, "r") as f:
+        return json.load(f)
+
+
+def _write_surfaces(data: dict) -> None:
+    with open(SCENARIO_SURFACES_FILE, "w") as f:
+        json.dump(data, f, indent=2)
+
+
+def get_scenario_surface(request_id: str) -> Optional[dict]:
+    """Fetch a scenario surface record (pending, running, completed or failed)."""
+    with _surfaces_file_lock():
+        return _read_surfaces()["scenario_surfaces"].get(request_id)
+
+
+def get_completed_scenario_surfaces(limit: int) -> List[Tuple[str, dict]]:
+    """Up to `limit` completed surfaces, most recently completed first."""
+    with _surfaces_file_lock():
+        surfaces = _read_surfaces()["scenario_surfaces"]
+    completed = [(k, v) for k, v in surfaces.items() if v.get("status") == "completed"]
+    completed.sort(key=lambda item: item[1].get("completed_at", 0), reverse=True)
+    return completed[:limit]
+
+
+def claim_scenario_surface(
+    request_id: str, request_data: dict, user_id: int, owner: str, lease_seconds: float
+) -> Tuple[str, dict]:
+    """
+    Atomically decide who computes a scenario surface.
+    Returns ("completed", record) if a result exists, ("running", record) if
+    another owner holds an unexpired lease, otherwise marks the record as
+    running under `owner` and returns ("claimed", record).
+    """
+    with _surfaces_file_lock():
+        data = _read_surfaces()
+        existing = data["scenario_surfaces"].get(request_id)
+
+        if existing is not None:
+            if existing.get("status") == "completed":
+                return "completed", existing
+            if (
+                existing.get("status") == "running"
+                and existing.get("owner") != owner
+                and time.time() - existing.get("claimed_at", 0) < lease_seconds
+            ):
+                return "running", existing
+
+        record = {
+            "status": "running",
+            "request": request_data,
+            "user_id": user_id,
+            "owner": owner,
+            "claimed_at": time.time(),
+        }
+        data["scenario_surfaces"][request_id] = record
+        _write_surfaces(data)
+        return "claimed", record
+
+
+def release_scenario_surface(request_id: str, owner: str) -> None:
+    """Drop a lease taken by claim_scenario_surface that won't be computed."""
+    with _surfaces_file_lock():
+        data = _read_surfaces()
+        existing = data["scenario_surfaces"].get(request_id)
+        if existing is not None and existing.get("status") == "running" and existing.get("owner") == owner:
+            del data["scenario_surfaces"][request_id]
+            _write_surfaces(data)
+
+
+def save_scenario_surface(request_id: str, record: dict) -> None:
+    """Store the final (completed or failed) record for a scenario surface."""
+    with _surfaces_file_lock():
+        data = _read_surfaces()
+        data["scenario_surfaces"][request_id] = record
+        _write_surfaces(data)
+
+
+# ─────────────────────────────────────
+# Admission point buckets (admission_buckets.json)
+# Shared by every worker process so a user's point budget is global.
+# ─────────────────────────────────────
+@contextmanager
+def admission_buckets():
+    """
+    Yield the per-user buckets ({user_key: [tokens, updated_at]}) under an
+    exclusive flock; changes made to the dict are written back on exit.
+    """
+    with _locked_file(ADMISSION_BUCKETS_FILE, _admission_lock):
+        data = {"buckets": {}}
+        if os.path.exists(ADMISSION_BUCKETS_FILE):
+            with open(ADMISSION_BUCKETS_FILE, "r") as f:
+                data = json.load(f)
+        try:
+            yield data["buckets"]
+        finally:
+            with open(ADMISSION_BUCKETS_FILE, "w") as f:
+                json.dump(data, f)
@@ -1,4 +1,17 @@
+import time
+
+# Taken before any other import, so the "imports" startup phase and
+# startupSeconds include loading FastAPI, SQLAlchemy, NumPy and the app
+STARTED_AT = time.monotonic()
+
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from typing import Optional
+
 from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 
@@ -13,17 +26,37 @@ from .auth import (
     create_refresh_token, get_current_user, verify_token
 )
 from .config import get_settings
+from . import admission
 from . import json_store
+from . import metrics
+from . import rating_model
+from . import stress_engine
+from . import surface_engine
+from . import warmup
 
 # ─────────────────────────────────────
 # App setup
 # ─────────────────────────────────────
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Create tables and the stress worker pool before serving, then warm the
+    worker in the background. /api/health answers immediately; /api/ready
+    only once warm-up is done.
+    """
+    warmup.mark_imports_done(STARTED_AT)
+    warmup.timed("database", lambda: Base.metadata.create_all(bind=engine))
+    stress_engine.start_pool(stress_engine.resolve_workers(settings.STRESS_MAX_WORKERS))
+    warm_task = asyncio.create_task(asyncio.to_thread(warmup.run))
+    yield
+    await warm_task
+    stress_engine.shutdown_pool()
 
 app = FastAPI(
     title="Investment Platform API",
     description="Backend API for Private Credit Investment Platform",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 settings = get_settings()
@@ -43,6 +76,29 @@ app.add_middleware(
 async def health_check():
     return {"status": "healthy", "message": "Backend is running"}
 
+@app.get("/api/ready")
+async def readiness_check():
+    """Ready once the analytics views, rating model and surface cache are warm"""
+    body = warmup.state.as_dict()
+    if not warmup.state.ready:
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content=body)
+    return body
+
+@app.get("/api/metrics")
+async def get_metrics():
+    return metrics.snapshot()
+
+# ─────────────────────────────────────
+# Admission control
+# ─────────────────────────────────────
+def too_many_requests(e: admission.AdmissionRejected) -> HTTPException:
+    """429 response for a request refused by admission control"""
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=e.detail,
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
 # ─────────────────────────────────────
 # Auth endpoints
 # ─────────────────────────────────────
@@ -140,6 +196,11 @@ async def get_portfolio(current_user: User = Depends(get_current_user)):
     ratings = json_store.get_credit_ratings(current_user.id)
     return {"total": len(ratings), "items": ratings}
 
+@app.get("/api/portfolio/analytics")
+async def get_portfolio_analytics(current_user: User = Depends(get_current_user)):
+    """Rating distribution, revenue-weighted averages and monthly counts"""
+    return json_store.get_portfolio_view(current_user.id).snapshot()
+
 @app.get("/api/portfolio/{computation_id}")
 async def get_credit_rating(
     computation_id: str,
@@ -185,6 +246,123 @@ async def add_credit_rating(
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
 
+@app.post("/api/portfolio/thresholds")
+async def get_portfolio_thresholds(
+    request_data: Optional[dict] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Rating thresholds for every credit rating in the portfolio.
+    Optional body: {"metrics": [...], "tolerance": 1e-9}
+    """
+    ratings = json_store.get_credit_ratings(current_user.id)
+    options = request_data or {}
+    try:
+        metric_names, tolerance = rating_model.solver_options(options.get("metrics"), options.get("tolerance", 1e-9))
+        cost = rating_model.solver_cost(len(ratings), len(metric_names), tolerance)
+        ticket = admission.controller.admit(current_user.id, cost)
+        items = await asyncio.to_thread(
+            ticket.run, rating_model.solve_thresholds, ratings, metric_names, tolerance
+        )
+    except admission.AdmissionRejected as e:
+        raise too_many_requests(e)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return {"total": len(items), "items": items}
+
+@app.post("/api/portfolio/stress")
+async def stress_portfolio(
+    request_data: Optional[dict] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Monte Carlo stress test of the whole portfolio.
+    Streams newline-delimited JSON: one partial aggregate per completed
+    chunk of paths, then the full result with "done": true.
+    """
+    try:
+        params = stress_engine.parse_params(request_data or {}, settings.STRESS_MAX_PATHS)
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    ids, X = json_store.get_portfolio_view(current_user.id).features()
+    ids, X, skipped = stress_engine.complete_rows(ids, X)
+    if not ids:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No credit ratings with complete metrics")
+
+    try:
+        ticket = admission.controller.admit(current_user.id, params["paths"] * len(ids))
+    except admission.AdmissionRejected as e:
+        raise too_many_requests(e)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    def stream():
+        with ticket:
+            for update in stress_engine.run_stress(
+                ids, X, params,
+                chunk_bytes=settings.STRESS_CHUNK_BYTES,
+                pool=stress_engine.get_pool(),
+                max_workers=stress_engine.resolve_workers(settings.STRESS_MAX_WORKERS),
+            ):
+                if update["done"]:
+                    update["skipped"] = skipped
+                yield json.dumps(update) + "\n"
+
+    # Refunds the ticket if the client goes away before streaming starts
+    return StreamingResponse(
+        stream(), media_type="application/x-ndjson", background=BackgroundTask(ticket.close)
+    )
+
+@app.post("/api/portfolio/{computation_id}/thresholds")
+async def get_credit_rating_thresholds(
+    computation_id: str,
+    request_data: Optional[dict] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Metric values at which a credit rating moves to the adjacent notches.
+    Optional body: {"metrics": [...], "tolerance": 1e-9}
+    """
+    rating = json_store.get_credit_rating_by_id(current_user.id, computation_id)
+    if not rating:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Credit rating not found")
+    options = request_data or {}
+    try:
+        [result] = rating_model.solve_thresholds(
+            [rating],
+            metrics=options.get("metrics"),
+            tolerance=options.get("tolerance", 1e-9),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if result["skipped"]:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Credit rating has {result['skipped']}")
+    return result
+
+@app.get("/api/portfolio/{computation_id}/versions")
+async def get_credit_rating_versions(
+    computation_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """List the stored versions of a credit rating"""
+    versions = json_store.get_credit_rating_versions(current_user.id, computation_id)
+    if versions is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Credit rating not found")
+    return {"total": len(versions), "items": versions}
+
+@app.get("/api/portfolio/{computation_id}/versions/{version}")
+async def get_credit_rating_version(
+    computation_id: str,
+    version: int,
+    current_user: User = Depends(get_current_user)
+):
+    """Get a credit rating as it was at a given version"""
+    record = json_store.get_credit_rating_version(current_user.id, computation_id, version)
+    if record is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Version not found")
+    return {"version": version, "record": record}
+
 @app.put("/api/portfolio/{computation_id}")
 async def update_credit_rating(
     computation_id: str,
@@ -192,7 +370,10 @@ async def update_credit_rating(
     current_user: User = Depends(get_current_user)
 ):
     """Update an existing credit rating"""
-    updated = json_store.update_credit_rating(current_user.id, computation_id, updated_fields)
+    try:
+        updated = json_store.update_credit_rating(current_user.id, computation_id, updated_fields)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
     if not updated:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Credit rating not found")
     return updated
@@ -228,6 +409,29 @@ async def get_scenario(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Scenario not found")
     return scenario
 
+@app.get("/api/scenarios/{computation_id}/versions")
+async def get_scenario_versions(
+    computation_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """List the stored versions of a scenario"""
+    versions = json_store.get_scenario_versions(current_user.id, computation_id)
+    if versions is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Scenario not found")
+    return {"total": len(versions), "items": versions}
+
+@app.get("/api/scenarios/{computation_id}/versions/{version}")
+async def get_scenario_version(
+    computation_id: str,
+    version: int,
+    current_user: User = Depends(get_current_user)
+):
+    """Get a scenario as it was at a given version"""
+    record = json_store.get_scenario_version(current_user.id, computation_id, version)
+    if record is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Version not found")
+    return {"version": version, "record": record}
+
 @app.put("/api/scenarios/{computation_id}")
 async def update_scenario(
     computation_id: str,
@@ -235,7 +439,10 @@ async def update_scenario(
     current_user: User = Depends(get_current_user)
 ):
     """Update an existing scenario (called on Submit)"""
-    updated = json_store.update_scenario(current_user.id, computation_id, updated_fields)
+    try:
+        updated = json_store.update_scenario(current_user.id, computation_id, updated_fields)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
     if not updated:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Scenario not found")
     print("updated_fields ->", current_user, computation_id, updated_fields)
@@ -244,25 +451,6 @@ async def update_scenario(
 # ─────────────────────────────────────
 # Scenario Surface endpoints
 # ─────────────────────────────────────
-import hashlib
-import json
-from pathlib import Path
-
-SCENARIO_SURFACES_FILE = Path(__file__).parent.parent / "data" / "scenario_surfaces.json"
-
-def load_scenario_surfaces():
-    """Load scenario surfaces from JSON file"""
-    if not SCENARIO_SURFACES_FILE.exists():
-        return {"scenario_surfaces": {}}
-    with open(SCENARIO_SURFACES_FILE, 'r') as f:
-        return json.load(f)
-
-def save_scenario_surfaces(data):
-    """Save scenario surfaces to JSON file"""
-    SCENARIO_SURFACES_FILE.parent.mkdir(parents=True, exist_ok=True)
-    with open(SCENARIO_SURFACES_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
-
 @app.post("/api/scenario-surface/request")
 async def scenario_surface_request(
     request_data: dict,
@@ -272,29 +460,21 @@ async def scenario_surface_request(
     Submit a scenario surface request.
     Returns a ScenarioSurfaceResponseID for polling.
     """
-    # Generate hash from all parameters for idempotent requests
-    params_str = json.dumps(request_data, sort_keys=True)
-    request_id = hashlib.sha256(params_str.encode()).hexdigest()[:16]
-    
-    # Load existing data
-    data = load_scenario_surfaces()
-    
-    # Check if this request already exists and is completed
-    if request_id in data["scenario_surfaces"]:
-        existing = data["scenario_surfaces"][request_id]
-        if existing.get("status") == "completed":
-            return {"scenarioSurfaceResponseId": request_id, "status": "completed"}
-    
-    # Store the request as pending (in a real system, this would trigger background processing)
-    # For now, we'll use mock data based on the request parameters
-    data["scenario_surfaces"][request_id] = {
-        "status": "pending",
-        "request": request_data,
-        "user_id": current_user.id
-    }
-    save_scenario_surfaces(data)
-    
-    return {"scenarioSurfaceResponseId": request_id, "status": "pending"}
+    # Hash of the canonical request, so equivalent sweeps share one id
+    try:
+        request_id = surface_engine.request_key(request_data)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    # Starts the computation, or joins an identical one already in flight
+    try:
+        state, _ = surface_engine.submit(request_id, request_data, current_user.id)
+    except admission.AdmissionRejected as e:
+        raise too_many_requests(e)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    return {"scenarioSurfaceResponseId": request_id, "status": state}
 
 @app.get("/api/scenario-surface/response/{response_id}")
 async def scenario_surface_response(
@@ -303,107 +483,36 @@ async def scenario_surface_response(
 ):
     """
     Poll for scenario surface response.
-    Returns empty/pending status until computation is complete.
+    Returns pending status until computation is complete.
     """
-    data = load_scenario_surfaces()
-    
-    if response_id not in data["scenario_surfaces"]:
+    surface_data = surface_engine.cached_result(response_id) or json_store.get_scenario_surface(response_id)
+
+    if surface_data is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Response ID not found")
-    
-    surface_data = data["scenario_surfaces"][response_id]
-    
-    # Check if still pending
-    if surface_data.get("status") == "pending":
-        # In a real system, check if background job completed
-        # For demo, we'll simulate completion by returning mock data based on request
-        request_params = surface_data.get("request", {})
-        
-        # Determine plot type based on how many parameters have bounds
-        params_with_bounds = sum(1 for k, v in request_params.items() 
-                                if k.endswith('_lower') or k.endswith('_upper'))
-        param_count = params_with_bounds // 2  # Each param has lower and upper
-        
-        _1d = False
-        _2d = True
-
-        # Generate mock response based on parameter count
-        if _1d or param_count == 1:
-            # Find which parameter has bounds
-            param_name = None
-            for key in request_params.keys():
-                if key.endswith('_lower'):
-                    param_name = key.replace('_lower', '')
-                    break
-            
-            surface_data = {
-                "status": "completed",
-                "plot_type": "1D",
-                "param_name": param_name or "revenue",
-                "timeseries": generate_1d_mock_data(param_name)
-            }
-        elif _2d or param_count == 2:
-            surface_data = {
-                "status": "completed",
-                "plot_type": "2D",
-                "param_names": ["revenue", "ebitdaMargin"],
-                "timeseries": generate_2d_mock_data()
-            }
+
+    if surface_data.get("status") in ("pending", "running") and surface_data.get("request"):
+        # Wait on the computation if it runs in this worker; otherwise keep polling
+        try:
+            state, future = surface_engine.submit(
+                response_id, surface_data["request"], current_user.id, count=False
+            )
+        except (admission.AdmissionRejected, ValueError):
+            state, future = "pending", None
+        if future is not None:
+            # Wait briefly so a nearly finished surface is returned on this
+            # poll, but never longer than the client's polling interval
+            try:
+                surface_data = await asyncio.wait_for(
+                    asyncio.shield(asyncio.wrap_future(future)), timeout=settings.SURFACE_POLL_WAIT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                surface_data = {"status": "pending"}
+        elif state == "completed":
+            surface_data = json_store.get_scenario_surface(response_id)
         else:
-            surface_data = {
-                "status": "completed",
-                "plot_type": "3D",
-                "param_names": ["revenue", "ebitdaMargin", "debtToEbitda"],
-                "timeseries": generate_3d_mock_data()
-            }
-        
-        # Save the completed result
-        data["scenario_surfaces"][response_id] = surface_data
-        save_scenario_surfaces(data)
-    
-    print(f"surface_data -> {surface_data}")
-    return surface_data
+            surface_data = {"status": "pending"}
 
-def generate_1d_mock_data(param_name):
-    """Generate mock 1D timeseries data"""
-    ratings = ["B", "B+", "BB-", "BB", "BB+", "BBB-", "BBB", "BBB+", "A-", "A"]
-    timeseries = {}
-    for i in range(10):
-        value = 40000000 + i * 2000000  # Example: revenue from 40M to 58M
-        timeseries[str(i)] = [value, ratings[i]]
-    return timeseries
-
-def generate_2d_mock_data():
-    """Generate mock 2D timeseries data"""
-    ratings = ["BB", "BB+", "BBB-", "BB+", "BBB-", "BBB", "BBB-", "BBB", "BBB+", "BBB", "BBB+", "A-"]
-    timeseries = {}
-    idx = 0
-    for rev in [50000000, 40000000,   55000000, 45000000,]:
-        for ebitda in [26.0, 18.0, 22.0, 19.0,]:
-            timeseries[str(idx)] = [rev, ebitda, ratings[idx % len(ratings)]]
-            idx += 1
-            if idx >= 12:
-                break
-        if idx >= 12:
-            break
-    return timeseries
-
-def generate_3d_mock_data():
-    """Generate mock 3D timeseries data"""
-    ratings = ["B+", "BB", "BB+", "BB", "BB+", "BBB-", "BB+", "BBB-", "BBB", "BBB-", "BBB", "BBB+"]
-    timeseries = {}
-    idx = 0
-    for rev in [40000000, 50000000]:
-        for ebitda in [20.0, 25.0]:
-            for debt in [4.0, 3.0, 2.0]:
-                timeseries[str(idx)] = [rev, ebitda, debt, ratings[idx % len(ratings)]]
-                idx += 1
-                if idx >= 12:
-                    break
-            if idx >= 12:
-                break
-        if idx >= 12:
-            break
-    return timeseries
+    return surface_data
 
 # ─────────────────────────────────────
 # Error handlers
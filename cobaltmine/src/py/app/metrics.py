@@ -0,0 +1,28 @@
+import threading
+from collections import defaultdict
+from typing import Dict
+
+# ─────────────────────────────────────
+# In-process counters and gauges, exposed at /api/metrics
+# ─────────────────────────────────────
+_lock = threading.Lock()
+_counters: Dict[str, float] = defaultdict(float)
+_gauges: Dict[str, float] = {}
+
+
+def increment(name: str, value: float = 1) -> None:
+    """Add value to a counter."""
+    with _lock:
+        _counters[name] += value
+
+
+def set_gauge(name: str, value: float) -> None:
+    """Set a gauge to its current value."""
+    with _lock:
+        _gauges[name] = value
+
+
+def snapshot() -> dict:
+    """Current counter and gauge values."""
+    with _lock:
+        return {"counters": dict(_counters), "gauges": dict(_gauges)}
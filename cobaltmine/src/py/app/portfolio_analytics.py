@@ -0,0 +1,169 @@
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.rating_model import METRICS, RATING_SCALE
+
+# Metrics reported as revenue-weighted averages
+WEIGHTED_METRICS = ["ebitdaMargin", "debtToEbitda", "interestCoverage"]
+
+_REVENUE_COL = METRICS.index("revenue")
+_WEIGHTED_COLS = [METRICS.index(m) for m in WEIGHTED_METRICS]
+
+_INITIAL_CAPACITY = 64
+
+
+def _numeric(value) -> float:
+    """Column value for a record field; NaN when missing or non-numeric."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return np.nan
+    return float(value)
+
+
+def _month(record: dict) -> str:
+    """YYYY-MM bucket for a record's dateCreated."""
+    date_created = record.get("dateCreated")
+    if isinstance(date_created, str) and len(date_created) >= 7:
+        return date_created[:7]
+    return "unknown"
+
+
+class PortfolioView:
+    """
+    Columnar (NumPy array-backed) view of one user's credit ratings.
+
+    Rows are stored in a preallocated (capacity, n_metrics) array with
+    missing values as NaN. Deletes swap the last row into the hole so the
+    live rows are always the leading rows of the array. Aggregates are adjusted on
+    every add/update/remove, so `snapshot()` never scans the rows.
+    """
+
+    def __init__(self, records: Sequence[dict] = ()):
+        self._lock = threading.Lock()
+        self._columns = np.full((_INITIAL_CAPACITY, len(METRICS)), np.nan)
+        self._ids: List[str] = []
+        self._ratings: List[Optional[str]] = []
+        self._months: List[str] = []
+        self._index: Dict[str, int] = {}
+
+        self._rating_counts: Counter = Counter()
+        self._month_counts: Counter = Counter()
+        self._revenue_total = 0.0
+        self._weights = np.zeros(len(WEIGHTED_METRICS))
+        self._weight_counts = np.zeros(len(WEIGHTED_METRICS), dtype=int)
+        self._weighted_sums = np.zeros(len(WEIGHTED_METRICS))
+
+        for record in records:
+            self._append(record)
+
+    # ─────────────────────────────────────
+    # Incremental maintenance
+    # ─────────────────────────────────────
+    def add(self, record: dict) -> None:
+        with self._lock:
+            self._append(record)
+
+    def update(self, computation_id: str, record: dict) -> None:
+        """
+        Replace the row for computation_id with the (already merged) record.
+        The row is re-keyed if the record's id differs from computation_id.
+        """
+        with self._lock:
+            row = self._index.pop(computation_id, None)
+            if row is None:
+                self._append(record)
+                return
+            self._ids[row] = record.get("id")
+            self._index[self._ids[row]] = row
+            self._apply(row, sign=-1)
+            self._write_row(row, record)
+            self._apply(row, sign=1)
+
+    def remove(self, computation_id: str) -> None:
+        with self._lock:
+            row = self._index.pop(computation_id, None)
+            if row is None:
+                return
+            self._apply(row, sign=-1)
+
+            last = len(self._ids) - 1
+            if row != last:
+                self._columns[row] = self._columns[last]
+                self._ids[row] = self._ids[last]
+                self._ratings[row] = self._ratings[last]
+                self._months[row] = self._months[last]
+                self._index[self._ids[row]] = row
+            self._columns[last] = np.nan
+            self._ids.pop()
+            self._ratings.pop()
+            self._months.pop()
+
+    def _append(self, record: dict) -> None:
+        row = len(self._ids)
+        if row == self._columns.shape[0]:
+            grown = np.full((row * 2, len(METRICS)), np.nan)
+            grown[:row] = self._columns
+            self._columns = grown
+        self._ids.append(record.get("id"))
+        self._ratings.append(None)
+        self._months.append("")
+        self._index[record.get("id")] = row
+        self._write_row(row, record)
+        self._apply(row, sign=1)
+
+    def _write_row(self, row: int, record: dict) -> None:
+        self._columns[row] = [_numeric(record.get(m)) for m in METRICS]
+        self._ratings[row] = record.get("creditRating")
+        self._months[row] = _month(record)
+
+    def _apply(self, row: int, sign: int) -> None:
+        """Add (sign=1) or subtract (sign=-1) one row's contribution to the aggregates."""
+        self._rating_counts[self._ratings[row] or "Unrated"] += sign
+        self._month_counts[self._months[row]] += sign
+
+        values = self._columns[row]
+        revenue = values[_REVENUE_COL]
+        if np.isnan(revenue):
+            return
+        self._revenue_total += sign * revenue
+
+        metric_values = values[_WEIGHTED_COLS]
+        valid = ~np.isnan(metric_values)
+        self._weights[valid] += sign * revenue
+        self._weight_counts[valid] += sign
+        self._weighted_sums[valid] += sign * revenue * metric_values[valid]
+
+    # ─────────────────────────────────────
+    # Reads
+    # ─────────────────────────────────────
+    def snapshot(self) -> dict:
+        """Current aggregates; cost is independent of the number of records."""
+        with self._lock:
+            rating_order = {r: i for i, r in enumerate(RATING_SCALE)}
+            distribution = {
+                rating: count
+                for rating, count in sorted(
+                    self._rating_counts.items(),
+                    key=lambda item: rating_order.get(item[0], len(RATING_SCALE)),
+                )
+                if count
+            }
+            by_month = {month: count for month, count in sorted(self._month_counts.items()) if count}
+            averages = {
+                metric: (float(self._weighted_sums[k] / self._weights[k]) if self._weight_counts[k] and self._weights[k] else None)
+                for k, metric in enumerate(WEIGHTED_METRICS)
+            }
+            return {
+                "total": len(self._ids),
+                "totalRevenue": float(self._revenue_total),
+                "ratingDistribution": distribution,
+                "revenueWeightedAverages": averages,
+                "countsByMonth": by_month,
+            }
+
+    def features(self) -> Tuple[List[str], np.ndarray]:
+        """Copy of the live rows as (ids, (n_records, n_metrics) matrix)."""
+        with self._lock:
+            return list(self._ids), self._columns[:len(self._ids)].copy()
@@ -0,0 +1,246 @@
+import math
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# ─────────────────────────────────────
+# Rating scale (worst → best)
+# ─────────────────────────────────────
+RATING_SCALE = [
+    "CCC-", "CCC", "CCC+",
+    "B-", "B", "B+",
+    "BB-", "BB", "BB+",
+    "BBB-", "BBB", "BBB+",
+    "A-", "A", "A+",
+    "AA-", "AA", "AA+",
+    "AAA",
+]
+
+# ─────────────────────────────────────
+# Scorecard definition
+# Each metric is scaled linearly between `lo` and `hi` (in log10
+# space for revenue) to a 0..1 sub-score, clipped at both ends.
+# `higher_is_better` flips the direction for leverage metrics.
+# ─────────────────────────────────────
+METRIC_SPECS = {
+    "revenue":          {"lo": 1e6, "hi": 10 ** 9.5, "weight": 0.10, "higher_is_better": True,  "log": True},
+    "ebitdaMargin":     {"lo": 0.0, "hi": 45.0,      "weight": 0.15, "higher_is_better": True,  "log": False},
+    "fcfToDebt":        {"lo": 0.0, "hi": 1.0,       "weight": 0.15, "higher_is_better": True,  "log": False},
+    "debtToEbitda":     {"lo": 0.5, "hi": 8.0,       "weight": 0.15, "higher_is_better": False, "log": False},
+    "netDebtToEbitda":  {"lo": 0.0, "hi": 7.5,       "weight": 0.10, "higher_is_better": False, "log": False},
+    "ebitdaToInterest": {"lo": 1.0, "hi": 15.0,      "weight": 0.10, "higher_is_better": True,  "log": False},
+    "roce":             {"lo": 0.0, "hi": 35.0,      "weight": 0.10, "higher_is_better": True,  "log": False},
+    "interestCoverage": {"lo": 1.0, "hi": 15.0,      "weight": 0.15, "higher_is_better": True,  "log": False},
+}
+
+METRICS = list(METRIC_SPECS.keys())
+
+_LO = np.array([METRIC_SPECS[m]["lo"] for m in METRICS], dtype=float)
+_HI = np.array([METRIC_SPECS[m]["hi"] for m in METRICS], dtype=float)
+_WEIGHTS = np.array([METRIC_SPECS[m]["weight"] for m in METRICS], dtype=float)
+_HIGHER_IS_BETTER = np.array([METRIC_SPECS[m]["higher_is_better"] for m in METRICS])
+_LOG = np.array([METRIC_SPECS[m]["log"] for m in METRICS])
+
+# Scaling constants in model space (log10 applied where configured)
+_LO_T = np.array([math.log10(s["lo"]) if s["log"] else s["lo"] for s in METRIC_SPECS.values()])
+_HI_T = np.array([math.log10(s["hi"]) if s["log"] else s["hi"] for s in METRIC_SPECS.values()])
+
+
+# ─────────────────────────────────────
+# Vectorized model
+# ─────────────────────────────────────
+def features_from_records(records: Sequence[dict]) -> np.ndarray:
+    """
+    Build an (n_records, n_metrics) feature matrix from credit-rating records.
+    Raises ValueError if a record is missing a metric or has a non-numeric value.
+    """
+    X = np.empty((len(records), len(METRICS)), dtype=float)
+    for i, record in enumerate(records):
+        for j, metric in enumerate(METRICS):
+            value = record.get(metric)
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError(
+                    f"Record '{record.get('id')}' has missing or non-numeric '{metric}'"
+                )
+            X[i, j] = value
+    return X
+
+
+def composite_score(X: np.ndarray) -> np.ndarray:
+    """Weighted 0..1 composite score for each row of a feature matrix."""
+    X = np.asarray(X, dtype=float)
+    transformed = np.where(_LOG, np.log10(np.maximum(X, 1.0)), X)
+    sub = np.clip((transformed - _LO_T) / (_HI_T - _LO_T), 0.0, 1.0)
+    sub = np.where(_HIGHER_IS_BETTER, sub, 1.0 - sub)
+    return sub @ _WEIGHTS
+
+
+def rate(X: np.ndarray) -> np.ndarray:
+    """Notch index into RATING_SCALE for each row of a feature matrix."""
+    n = len(RATING_SCALE)
+    notches = np.floor(composite_score(X) * n).astype(int)
+    return np.clip(notches, 0, n - 1)
+
+
+def notch_to_rating(notch: int) -> str:
+    """Map a notch index to its rating label."""
+    return RATING_SCALE[int(notch)]
+
+
+def rate_records(records: Sequence[dict]) -> List[str]:
+    """Rating labels for a list of credit-rating records."""
+    return [notch_to_rating(n) for n in rate(features_from_records(records))]
+
+
+# ─────────────────────────────────────
+# Threshold solver ("distance to next notch")
+# ─────────────────────────────────────
+# Below ~1e-15 the bisection can't narrow further in float64 anyway
+MIN_TOLERANCE = 1e-15
+
+
+def solver_options(metrics=None, tolerance=1e-9) -> Tuple[List[str], float]:
+    """
+    Validate solver options from a request body. Returns (metrics, tolerance);
+    metrics defaults to every scorecard metric. Raises ValueError on bad input.
+    """
+    if metrics is None:
+        metrics = list(METRICS)
+    elif not isinstance(metrics, (list, tuple)) or not metrics or not all(isinstance(m, str) for m in metrics):
+        raise ValueError("metrics must be a non-empty list of metric names")
+    unknown = [m for m in metrics if m not in METRIC_SPECS]
+    if unknown:
+        raise ValueError(f"Unknown metrics: {', '.join(unknown)}")
+    if isinstance(tolerance, bool) or not isinstance(tolerance, (int, float)) or not MIN_TOLERANCE <= tolerance < 1:
+        raise ValueError(f"tolerance must be a number in [{MIN_TOLERANCE:g}, 1)")
+    return list(metrics), float(tolerance)
+
+
+def solver_cost(n_records: int, n_metrics: int, tolerance: float = 1e-9) -> int:
+    """Row evaluations solve_thresholds will perform, used for admission control."""
+    iterations = math.ceil(math.log2(1.0 / float(tolerance))) + 1
+    return n_records * n_metrics * 2 * iterations
+
+
+def _invalid_metric(record: dict) -> Optional[str]:
+    """First metric that is missing or non-numeric in a record, if any."""
+    for metric in METRICS:
+        value = record.get(metric)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return metric
+    return None
+
+
+def solve_thresholds(
+    records: Sequence[dict],
+    metrics: Optional[Sequence[str]] = None,
+    tolerance: float = 1e-9,
+) -> List[dict]:
+    """
+    For each record and metric, find the metric value at which the model
+    rating crosses into the adjacent notch above (upgrade) and below
+    (downgrade), holding every other metric fixed.
+
+    All (record, metric, direction) problems are solved together by a
+    vectorized bisection, so the cost is ~log2(1 / tolerance) model
+    evaluations in total rather than one grid sweep per metric.
+    A side is None when no value inside the scorecard range reaches it.
+    Records with a missing or non-numeric metric can't be rated; their
+    item has "skipped" set to the reason and no thresholds.
+    """
+    metrics, tolerance = solver_options(metrics, tolerance)
+
+    results = []
+    complete = []  # (result index, record) for every record that can be rated
+    for record in records:
+        invalid = _invalid_metric(record)
+        results.append({
+            "id": record.get("id"),
+            "creditRating": record.get("creditRating"),
+            "modelRating": None,
+            "thresholds": None,
+            "skipped": f"missing or non-numeric '{invalid}'" if invalid else None,
+        })
+        if invalid is None:
+            complete.append((len(results) - 1, record))
+
+    if not complete:
+        return results
+
+    X = features_from_records([record for _, record in complete])
+    current = rate(X)
+    top = len(RATING_SCALE) - 1
+
+    for i, (r, _) in enumerate(complete):
+        results[r]["modelRating"] = notch_to_rating(current[i])
+        results[r]["thresholds"] = {
+            metric: {"value": float(X[i, METRICS.index(metric)]), "upgrade": None, "downgrade": None}
+            for metric in metrics
+        }
+
+    # One bisection problem per (record, metric, direction)
+    rows, cols, starts, ends, targets, directions, keys = [], [], [], [], [], [], []
+    for i, (r, _) in enumerate(complete):
+        for metric in metrics:
+            j = METRICS.index(metric)
+            spec = METRIC_SPECS[metric]
+            for direction, label in ((1, "upgrade"), (-1, "downgrade")):
+                target = current[i] + direction
+                if target < 0 or target > top:
+                    continue
+                improves_upward = spec["higher_is_better"] == (direction == 1)
+                rows.append(i)
+                cols.append(j)
+                starts.append(X[i, j])
+                ends.append(spec["hi"] if improves_upward else spec["lo"])
+                targets.append(target)
+                directions.append(direction)
+                keys.append((r, metric, label))
+
+    if not keys:
+        return results
+
+    rows = np.array(rows)
+    cols = np.array(cols)
+    starts = np.array(starts, dtype=float)
+    ends = np.array(ends, dtype=float)
+    targets = np.array(targets)
+    directions = np.array(directions)
+    base = X[rows]
+    index = np.arange(len(rows))
+
+    def reached(t: np.ndarray) -> np.ndarray:
+        probe = base.copy()
+        probe[index, cols] = starts + t * (ends - starts)
+        return (rate(probe) - targets) * directions >= 0
+
+    # Problems whose far end never reaches the adjacent notch have no threshold
+    solvable = reached(np.ones(len(rows)))
+
+    lo = np.zeros(len(rows))
+    hi = np.ones(len(rows))
+    for _ in range(math.ceil(math.log2(1.0 / tolerance))):
+        mid = (lo + hi) / 2.0
+        ok = reached(mid)
+        hi = np.where(ok, mid, hi)
+        lo = np.where(ok, lo, mid)
+
+    values = starts + hi * (ends - starts)
+    for k, (r, metric, label) in enumerate(keys):
+        if solvable[k]:
+            results[r]["thresholds"][metric][label] = {
+                "rating": notch_to_rating(targets[k]),
+                "value": float(values[k]),
+            }
+
+    return results
+
+
+def warm_up() -> None:
+    """
+    Run the scoring and solver code paths once on synthetic data so the
+    first real request doesn't pay NumPy's lazy initialisation costs.
+    """
+    midpoint = {m: (s["lo"] + s["hi"]) / 2.0 for m, s in METRIC_SPECS.items()}
+    rate(features_from_records([midpoint] * 8))
+    solve_thresholds([midpoint], tolerance=1e-3)
@@ -0,0 +1,295 @@
+import math
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Iterator, List, Optional
+
+import numpy as np
+
+from app.rating_model import METRICS, RATING_SCALE, rate
+
+# ─────────────────────────────────────
+# Shock model
+# Three correlated shock variables are drawn per (path, name):
+#   revenue  – log change in revenue
+#   margin   – additive change in ebitdaMargin (percentage points)
+#   leverage – log change in debt relative to earnings
+# Each is a mix of a per-path systematic factor and a per-name
+# idiosyncratic draw, both with the same cross-variable correlation.
+# ─────────────────────────────────────
+SHOCK_VARIABLES = ["revenue", "margin", "leverage"]
+
+DEFAULT_VOLATILITIES = {"revenue": 0.15, "margin": 3.0, "leverage": 0.20}
+DEFAULT_CORRELATION = [
+    [1.0, 0.5, -0.5],
+    [0.5, 1.0, -0.5],
+    [-0.5, -0.5, 1.0],
+]
+DEFAULT_SYSTEMATIC_WEIGHT = 0.6
+
+_REVENUE = METRICS.index("revenue")
+_MARGIN = METRICS.index("ebitdaMargin")
+_LEVERAGE_UP = [METRICS.index(m) for m in ("debtToEbitda", "netDebtToEbitda")]
+_LEVERAGE_DOWN = [METRICS.index(m) for m in ("fcfToDebt", "ebitdaToInterest", "interestCoverage")]
+
+_N_NOTCHES = len(RATING_SCALE)
+
+# Rough bytes touched per simulated (path, name) pair, used to size chunks
+_BYTES_PER_NAME_PATH = (len(METRICS) * 3 + len(SHOCK_VARIABLES) * 4) * 8
+
+
+def parse_params(request_data: dict, max_paths: int) -> dict:
+    """Validate a stress request body. Raises ValueError on bad input."""
+    paths = int(request_data.get("paths", 1000))
+    if not 1 <= paths <= max_paths:
+        raise ValueError(f"paths must be between 1 and {max_paths}")
+
+    volatilities = dict(DEFAULT_VOLATILITIES)
+    overrides = request_data.get("volatilities") or {}
+    if not isinstance(overrides, dict):
+        raise ValueError("volatilities must map shock variables to values")
+    for name, value in overrides.items():
+        if name not in volatilities:
+            raise ValueError(f"Unknown shock variable '{name}'")
+        value = float(value)
+        if not math.isfinite(value) or value < 0:
+            raise ValueError("volatilities must be finite and non-negative")
+        volatilities[name] = value
+
+    correlation = np.asarray(request_data.get("correlation", DEFAULT_CORRELATION), dtype=float)
+    if correlation.shape != (3, 3):
+        raise ValueError("correlation must be a 3x3 matrix")
+    if not np.isfinite(correlation).all():
+        raise ValueError("correlation must be finite")
+    # cholesky only reads the lower triangle, so check the rest explicitly
+    if not np.allclose(correlation, correlation.T) or not np.allclose(np.diag(correlation), 1.0):
+        raise ValueError("correlation must be symmetric with a unit diagonal")
+    try:
+        cholesky = np.linalg.cholesky(correlation)
+    except np.linalg.LinAlgError:
+        raise ValueError("correlation must be positive definite")
+
+    systematic_weight = float(request_data.get("systematicWeight", DEFAULT_SYSTEMATIC_WEIGHT))
+    if not 0.0 <= systematic_weight <= 1.0:
+        raise ValueError("systematicWeight must be between 0 and 1")
+
+    seed = request_data.get("seed")
+    if seed is not None and (isinstance(seed, bool) or not isinstance(seed, int) or seed < 0):
+        raise ValueError("seed must be a non-negative integer")
+    return {
+        "paths": paths,
+        "seed": seed,
+        "volatilities": np.array([volatilities[v] for v in SHOCK_VARIABLES]),
+        "cholesky": cholesky,
+        "systematic_weight": systematic_weight,
+    }
+
+
+# ─────────────────────────────────────
+# Chunk simulation (runs in worker processes)
+# ─────────────────────────────────────
+def _simulate_chunk(
+    X: np.ndarray, base: np.ndarray, params: dict, seed_seq: np.random.SeedSequence, n_paths: int
+) -> dict:
+    """Simulate n_paths paths for the whole portfolio and aggregate them."""
+    n_names = X.shape[0]
+    rng = np.random.default_rng(seed_seq)
+
+    chol_t = params["cholesky"].T
+    w = params["systematic_weight"]
+    systematic = rng.standard_normal((n_paths, 1, 3)) @ chol_t
+    idiosyncratic = rng.standard_normal((n_paths, n_names, 3)) @ chol_t
+    shocks = (math.sqrt(w) * systematic + math.sqrt(1.0 - w) * idiosyncratic) * params["volatilities"]
+
+    shocked = np.broadcast_to(X, (n_paths,) + X.shape).copy()
+    shocked[..., _REVENUE] *= np.exp(shocks[..., 0])
+    shocked[..., _MARGIN] += shocks[..., 1]
+    leverage = np.exp(shocks[..., 2])
+    shocked[..., _LEVERAGE_UP] *= leverage[..., None]
+    shocked[..., _LEVERAGE_DOWN] /= leverage[..., None]
+
+    notches = rate(shocked.reshape(-1, len(METRICS))).reshape(n_paths, n_names)
+    change = notches - base
+    downgraded = change < 0
+
+    return {
+        "paths": n_paths,
+        "migrations": np.bincount(
+            (base * _N_NOTCHES + notches).ravel(), minlength=_N_NOTCHES * _N_NOTCHES
+        ),
+        "downgrade_histogram": np.bincount(downgraded.sum(axis=1), minlength=n_names + 1),
+        "name_downgrades": downgraded.sum(axis=0),
+        "name_notch_change": change.sum(axis=0),
+    }
+
+
+# ─────────────────────────────────────
+# Aggregation
+# ─────────────────────────────────────
+class StressAggregate:
+    """Running totals over completed chunks."""
+
+    def __init__(self, ids: List[str], base: np.ndarray, paths_total: int):
+        self.ids = ids
+        self.base = base
+        self.paths_total = paths_total
+        self.paths_completed = 0
+        self.migrations = np.zeros(_N_NOTCHES * _N_NOTCHES, dtype=np.int64)
+        self.downgrade_histogram = np.zeros(len(ids) + 1, dtype=np.int64)
+        self.name_downgrades = np.zeros(len(ids), dtype=np.int64)
+        self.name_notch_change = np.zeros(len(ids), dtype=np.int64)
+
+    def merge(self, chunk: dict) -> None:
+        self.paths_completed += chunk["paths"]
+        self.migrations += chunk["migrations"]
+        self.downgrade_histogram += chunk["downgrade_histogram"]
+        self.name_downgrades += chunk["name_downgrades"]
+        self.name_notch_change += chunk["name_notch_change"]
+
+    def _downgrade_count_summary(self) -> dict:
+        counts = np.arange(len(self.downgrade_histogram))
+        cumulative = np.cumsum(self.downgrade_histogram)
+
+        def percentile(q: float) -> int:
+            return int(np.searchsorted(cumulative, q * self.paths_completed, side="left"))
+
+        nonzero = np.nonzero(self.downgrade_histogram)[0]
+        return {
+            "mean": float(counts @ self.downgrade_histogram / self.paths_completed),
+            "p50": percentile(0.50),
+            "p95": percentile(0.95),
+            "p99": percentile(0.99),
+            "max": int(nonzero[-1]) if len(nonzero) else 0,
+        }
+
+    def partial(self) -> dict:
+        """Compact summary streamed after each chunk."""
+        name_paths = self.paths_completed * len(self.ids)
+        return {
+            "done": False,
+            "pathsCompleted": self.paths_completed,
+            "pathsTotal": self.paths_total,
+            "downgradeProbability": float(self.name_downgrades.sum() / name_paths),
+            "downgradeCounts": self._downgrade_count_summary(),
+        }
+
+    def final(self) -> dict:
+        """Full result: migration matrix, downgrade-count distribution and per-name stats."""
+        result = self.partial()
+        result["done"] = True
+        result["ratings"] = RATING_SCALE
+        result["migrationMatrix"] = self.migrations.reshape(_N_NOTCHES, _N_NOTCHES).tolist()
+        result["downgradeCountDistribution"] = {
+            str(k): int(self.downgrade_histogram[k]) for k in np.nonzero(self.downgrade_histogram)[0]
+        }
+        result["names"] = [
+            {
+                "id": computation_id,
+                "baseRating": RATING_SCALE[self.base[i]],
+                "downgradeProbability": float(self.name_downgrades[i] / self.paths_completed),
+                "expectedNotchChange": float(self.name_notch_change[i] / self.paths_completed),
+            }
+            for i, computation_id in enumerate(self.ids)
+        ]
+        return result
+
+
+# ─────────────────────────────────────
+# Worker pool
+# One long-lived pool per app process, created in the app lifespan.
+# Workers are spawned rather than forked because the app process runs
+# threads (uvicorn, the surface executor) that a fork would copy mid-state.
+# ─────────────────────────────────────
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def start_pool(max_workers: int) -> None:
+    """Create this process' stress pool; a single worker runs in-process instead."""
+    global _pool
+    if _pool is None and max_workers > 1:
+        _pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+def get_pool() -> Optional[ProcessPoolExecutor]:
+    return _pool
+
+
+# ─────────────────────────────────────
+# Driver
+# ─────────────────────────────────────
+def chunk_paths(n_names: int, chunk_bytes: int) -> int:
+    """Paths per chunk so that one chunk's working set stays within chunk_bytes."""
+    return max(1, chunk_bytes // (max(n_names, 1) * _BYTES_PER_NAME_PATH))
+
+
+def run_stress(
+    ids: List[str],
+    X: np.ndarray,
+    params: dict,
+    chunk_bytes: int,
+    pool: Optional[Executor] = None,
+    max_workers: int = 1,
+) -> Iterator[dict]:
+    """
+    Run the simulation chunk by chunk, yielding a partial aggregate after
+    each chunk completes and the full result last. Chunks run on `pool`
+    (with max_workers workers) if given, otherwise in this process. At
+    most 2 × max_workers chunks are in flight, so memory stays bounded by
+    chunk_bytes per chunk regardless of the total number of paths.
+    """
+    base = rate(X)
+    aggregate = StressAggregate(ids, base, params["paths"])
+
+    per_chunk = chunk_paths(len(ids), chunk_bytes)
+    sizes = [per_chunk] * (params["paths"] // per_chunk)
+    if params["paths"] % per_chunk:
+        sizes.append(params["paths"] % per_chunk)
+    seeds = np.random.SeedSequence(params["seed"]).spawn(len(sizes))
+
+    if pool is None or len(sizes) == 1:
+        for seed_seq, size in zip(seeds, sizes):
+            aggregate.merge(_simulate_chunk(X, base, params, seed_seq, size))
+            yield aggregate.partial()
+        yield aggregate.final()
+        return
+
+    pending = deque()
+    try:
+        work = iter(zip(seeds, sizes))
+        for seed_seq, size in work:
+            pending.append(pool.submit(_simulate_chunk, X, base, params, seed_seq, size))
+            if len(pending) >= 2 * max_workers:
+                break
+        while pending:
+            aggregate.merge(pending.popleft().result())
+            yield aggregate.partial()
+            nxt = next(work, None)
+            if nxt is not None:
+                pending.append(pool.submit(_simulate_chunk, X, base, params, *nxt))
+    finally:
+        # The pool outlives this request; drop chunks a disconnected client left queued
+        for future in pending:
+            future.cancel()
+
+    yield aggregate.final()
+
+
+def complete_rows(ids: List[str], X: np.ndarray) -> tuple:
+    """Drop names with missing metrics; returns (ids, X, skipped_ids)."""
+    complete = ~np.isnan(X).any(axis=1)
+    kept = [i for i, ok in zip(ids, complete) if ok]
+    skipped = [i for i, ok in zip(ids, complete) if not ok]
+    return kept, X[complete], skipped
+
+
+def resolve_workers(configured: int) -> int:
+    """STRESS_MAX_WORKERS of 0 means one worker per CPU."""
+    return configured if configured > 0 else (os.cpu_count() or 1)
@@ -0,0 +1,489 @@
+import hashlib
+import itertools
+import json
+import math
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app import admission, json_store, metrics
+from app.config import get_settings
+from app.rating_model import METRICS, notch_to_rating, rate
+
+settings = get_settings()
+
+
+def worker_id() -> str:
+    """Identifies this worker process in scenario-surface leases."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+# ─────────────────────────────────────
+# Request canonicalization
+# Equivalent requests must map to the same key: parameter names are
+# matched case- and separator-insensitively, keys that don't affect the
+# model (computationId, ...) are dropped, and every value is snapped to
+# its metric's grid resolution. Each swept axis then steps by the smallest
+# power-of-two multiple of that resolution that spans the range in at most
+# the requested number of steps, so overlapping sweeps of similar span land
+# on the same lattice points and can share tiles. The evaluated axis is
+# widened outward to the enclosing stride multiples, so it always covers
+# the requested bounds with between about steps / 2 and steps + 1 points.
+# ─────────────────────────────────────
+DEFAULT_RESOLUTIONS = {
+    "revenue": 100000.0,
+    "ebitdaMargin": 0.1,
+    "fcfToDebt": 0.01,
+    "debtToEbitda": 0.01,
+    "netDebtToEbitda": 0.01,
+    "ebitdaToInterest": 0.01,
+    "roce": 0.1,
+    "interestCoverage": 0.01,
+}
+
+RESOLUTIONS = dict(DEFAULT_RESOLUTIONS, **settings.SURFACE_RESOLUTIONS)
+
+_ALIASES = {"".join(c for c in m.lower() if c.isalpha()): m for m in METRICS}
+
+
+def _metric_name(key: str) -> Optional[str]:
+    return _ALIASES.get("".join(c for c in key.lower() if c.isalpha()))
+
+
+def _snap(metric: str, value) -> int:
+    """Lattice index (in units of the metric's resolution) nearest to value."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"'{metric}' values must be numeric")
+    scaled = value / RESOLUTIONS[metric]
+    if not math.isfinite(scaled):
+        raise ValueError(f"'{metric}' values must be finite")
+    return int(round(scaled))
+
+
+def _value(metric: str, index: int) -> float:
+    return float(f"{index * RESOLUTIONS[metric]:.12g}")
+
+
+def canonicalize(request_data: dict, steps: int) -> dict:
+    """
+    Canonical form of a surface request. Raises ValueError if it can't be
+    evaluated. Bounds are lattice indices; `strides` is each axis' step in
+    lattice units.
+    """
+    values: Dict[str, float] = {}
+    bounds: Dict[str, Dict[str, float]] = {}
+    for key, value in request_data.items():
+        side = None
+        if key.endswith("_lower") or key.endswith("_upper"):
+            key, side = key[:-6], key[-5:]
+        metric = _metric_name(key)
+        if metric is None:
+            continue
+        target = bounds.setdefault(metric, {}) if side else values
+        slot = side or metric
+        if slot in target and target[slot] != value:
+            raise ValueError(f"Conflicting values given for '{metric}'")
+        target[slot] = value
+
+    # Same rule as the frontend: a metric is swept if either bound is non-zero
+    params = [m for m in METRICS if (bounds.get(m, {}).get("lower") or 0) != 0
+              or (bounds.get(m, {}).get("upper") or 0) != 0]
+    if not 1 <= len(params) <= 3:
+        raise ValueError("Specify non-zero bounds for 1, 2 or 3 parameters")
+
+    axes = {}
+    for metric in params:
+        raw_lower = bounds[metric].get("lower") or 0
+        raw_upper = bounds[metric].get("upper") or 0
+        lower = _snap(metric, raw_lower)
+        upper = _snap(metric, raw_upper)
+        lower, upper = min(lower, upper), max(lower, upper)
+        if lower == upper and raw_lower != raw_upper:
+            # Snapping would collapse the range to one point that needn't lie in it
+            raise ValueError(
+                f"'{metric}' range is narrower than its grid resolution ({RESOLUTIONS[metric]:g})"
+            )
+        spacing = (upper - lower) / max(steps - 1, 1)
+        stride = 1 << int(np.ceil(np.log2(spacing))) if spacing > 1 else 1
+        axes[metric] = {"lower": lower, "upper": upper, "stride": stride}
+
+    # Every other metric is held fixed, so it needs a numeric base value
+    fixed = {}
+    for metric in METRICS:
+        if metric in params:
+            continue
+        if metric not in values:
+            raise ValueError(f"'{metric}' is required as it is held fixed in the sweep")
+        fixed[metric] = _snap(metric, values[metric])
+
+    return {"params": params, "axes": axes, "fixed": fixed}
+
+
+def request_key(request_data: dict) -> str:
+    """Cache / response id for a request: hash of its canonical form."""
+    canonical = canonicalize(request_data, settings.SURFACE_GRID_STEPS)
+    params_str = json.dumps(canonical, sort_keys=True)
+    return hashlib.sha256(params_str.encode()).hexdigest()[:16]
+
+
+def validate_request(request_data: dict) -> List[str]:
+    """Check a surface request can be evaluated and return its swept metrics."""
+    return canonicalize(request_data, settings.SURFACE_GRID_STEPS)["params"]
+
+
+def grid_size(request_data: dict) -> int:
+    """Number of grid points the request evaluates."""
+    canonical = canonicalize(request_data, settings.SURFACE_GRID_STEPS)
+    size = 1
+    for axis in canonical["axes"].values():
+        lo, hi = _axis_range(axis)
+        size *= hi - lo + 1
+    return size
+
+
+def _axis_range(axis: dict) -> Tuple[int, int]:
+    """Stride indices at or just outside an axis' lower and upper bounds."""
+    stride = axis["stride"]
+    return axis["lower"] // stride, -(-axis["upper"] // stride)
+
+
+# ─────────────────────────────────────
+# Tile cache
+# Ratings are stored as fixed-size tiles of TILE points per axis, keyed by
+# the fixed metrics, the swept metrics and their strides, and the tile's
+# position on the lattice. A request is assembled from cached tiles. A
+# missing tile first takes every point it shares with cached tiles of a
+# coarser stride (strides are powers of two, so a zoomed-in grid contains
+# every other, every fourth, ... point of the coarser one), and only the
+# remaining points are evaluated, in one vectorized model call.
+# ─────────────────────────────────────
+_tiles: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+_tiles_lock = threading.Lock()
+# (fixed, params) -> stride combinations that have had tiles cached
+_tile_strides: Dict[tuple, set] = {}
+
+
+def _get_tiles(keys: List[tuple]) -> Dict[tuple, np.ndarray]:
+    with _tiles_lock:
+        found = {}
+        for key in keys:
+            tile = _tiles.get(key)
+            if tile is not None:
+                _tiles.move_to_end(key)
+                found[key] = tile
+        return found
+
+
+def _put_tiles(tiles: Dict[tuple, np.ndarray]) -> None:
+    with _tiles_lock:
+        for key, tile in tiles.items():
+            _tiles[key] = tile
+            _tiles.move_to_end(key)
+            _tile_strides.setdefault(key[:2], set()).add(key[2])
+        while len(_tiles) > settings.SURFACE_TILE_CACHE_SIZE:
+            _tiles.popitem(last=False)
+
+
+def _fill_from_coarser(context: tuple, position: tuple, tile: np.ndarray) -> int:
+    """
+    Copy into `tile` (-1 = unknown) the points that cached tiles with a
+    coarser stride on the same lattice already hold. Returns the number
+    of points filled.
+    """
+    size = settings.SURFACE_TILE_SIZE
+    strides = context[2]
+    with _tiles_lock:
+        candidates = list(_tile_strides.get(context[:2], ()))
+
+    filled = 0
+    for coarse in candidates:
+        if coarse == strides or any(c % s for c, s in zip(coarse, strides)):
+            continue
+        factors = [c // s for c, s in zip(coarse, strides)]
+        # Per axis: offsets in this tile that lie on the coarse grid, and
+        # where they sit in the coarse tiles
+        local, coarse_index = [], []
+        for k, f in enumerate(factors):
+            j = np.arange(position[k] * size, (position[k] + 1) * size)
+            on_grid = j % f == 0
+            local.append(np.nonzero(on_grid)[0])
+            coarse_index.append(j[on_grid] // f)
+        if any(len(x) == 0 for x in local):
+            continue
+
+        coarse_positions = [np.unique(index // size) for index in coarse_index]
+        keys = [context[:2] + (coarse, p) for p in itertools.product(*coarse_positions)]
+        for key, coarse_tile in _get_tiles(keys).items():
+            masks = [index // size == p for index, p in zip(coarse_index, key[3])]
+            dst = np.ix_(*[x[m] for x, m in zip(local, masks)])
+            src = np.ix_(*[index[m] % size for index, m in zip(coarse_index, masks)])
+            filled += int((tile[dst] < 0).sum())
+            tile[dst] = coarse_tile[src]
+    return filled
+
+
+def _complete_tiles(canonical: dict, tiles: Dict[tuple, np.ndarray]) -> int:
+    """
+    Rate the unknown (-1) points of the given tiles, keyed by position,
+    with one model call. Returns the number of points evaluated.
+    """
+    size = settings.SURFACE_TILE_SIZE
+    params = canonical["params"]
+    base = np.array(
+        [_value(m, canonical["fixed"][m]) if m in canonical["fixed"] else 0.0 for m in METRICS]
+    )
+    offsets = np.stack(
+        np.meshgrid(*[np.arange(size)] * len(params), indexing="ij"), axis=-1
+    ).reshape(-1, len(params))
+
+    unknown = {position: np.nonzero(tile.ravel() < 0)[0] for position, tile in tiles.items()}
+    X = np.tile(base, (sum(len(u) for u in unknown.values()), 1))
+    row = 0
+    for position, points in unknown.items():
+        rows = slice(row, row + len(points))
+        for k, metric in enumerate(params):
+            stride = canonical["axes"][metric]["stride"]
+            index = (position[k] * size + offsets[points, k]) * stride
+            X[rows, METRICS.index(metric)] = index * RESOLUTIONS[metric]
+        row += len(points)
+
+    notches = rate(X).astype(np.int8)
+    row = 0
+    for position, points in unknown.items():
+        tiles[position].ravel()[points] = notches[row:row + len(points)]
+        row += len(points)
+    return row
+
+
+def evaluate_surface(request_data: dict, steps: int) -> dict:
+    """
+    Rate every lattice point of the canonical grid over the swept
+    parameters, holding the other metrics at the request's values.
+    """
+    canonical = canonicalize(request_data, steps)
+    params = canonical["params"]
+    size = settings.SURFACE_TILE_SIZE
+
+    ranges = [_axis_range(canonical["axes"][m]) for m in params]
+    tile_ranges = [range(lo // size, hi // size + 1) for lo, hi in ranges]
+    context = (
+        tuple(sorted(canonical["fixed"].items())),
+        tuple(params),
+        tuple(canonical["axes"][m]["stride"] for m in params),
+    )
+
+    positions = list(itertools.product(*tile_ranges))
+    keys = [context + (position,) for position in positions]
+    tiles = _get_tiles(keys)
+    missing = [position for position, key in zip(positions, keys) if key not in tiles]
+    metrics.increment("surface_tiles_hit", len(positions) - len(missing))
+    metrics.increment("surface_tiles_computed", len(missing))
+    if missing:
+        partial = {p: np.full((size,) * len(params), -1, dtype=np.int8) for p in missing}
+        reused = sum(_fill_from_coarser(context, p, tile) for p, tile in partial.items())
+        evaluated = _complete_tiles(canonical, partial)
+        metrics.increment("surface_points_reused", reused)
+        metrics.increment("surface_points_computed", evaluated)
+        computed = {context + (p,): tile for p, tile in partial.items()}
+        _put_tiles(computed)
+        tiles.update(computed)
+
+    # Copy the overlap of each tile into the output grid
+    notches = np.empty([hi - lo + 1 for lo, hi in ranges], dtype=np.int8)
+    for position, key in zip(positions, keys):
+        src, dst = [], []
+        for k, (lo, hi) in enumerate(ranges):
+            start = max(lo, position[k] * size)
+            stop = min(hi + 1, (position[k] + 1) * size)
+            src.append(slice(start - position[k] * size, stop - position[k] * size))
+            dst.append(slice(start - lo, stop - lo))
+        notches[tuple(dst)] = tiles[key][tuple(src)]
+
+    axes = [
+        [_value(m, j * canonical["axes"][m]["stride"]) for j in range(lo, hi + 1)]
+        for m, (lo, hi) in zip(params, ranges)
+    ]
+    timeseries = {
+        str(i): list(point) + [notch_to_rating(n)]
+        for i, (point, n) in enumerate(zip(itertools.product(*axes), notches.ravel()))
+    }
+    # The evaluated grid, which may extend past the requested bounds
+    grid = {
+        m: {
+            "lower": axis[0],
+            "upper": axis[-1],
+            "step": _value(m, canonical["axes"][m]["stride"]),
+            "points": len(axis),
+        }
+        for m, axis in zip(params, axes)
+    }
+    result = {"status": "completed", "plot_type": f"{len(params)}D", "timeseries": timeseries, "grid": grid}
+    if len(params) == 1:
+        result["param_name"] = params[0]
+    else:
+        result["param_names"] = params
+    return result
+
+
+# ─────────────────────────────────────
+# Single-flight execution
+# ─────────────────────────────────────
+class SingleFlight:
+    """
+    Runs at most one call per key at a time. Callers that submit a key
+    while it is in flight get the same Future as the original caller.
+    """
+
+    def __init__(self, executor: ThreadPoolExecutor):
+        self._executor = executor
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+
+    def get(self, key: str) -> Optional[Future]:
+        with self._lock:
+            return self._calls.get(key)
+
+    def submit(
+        self, key: str, fn: Callable, *args, ticket: Optional[admission.Ticket] = None
+    ) -> Tuple[Future, bool]:
+        """
+        Returns (future, started) where started is False for a coalesced call.
+        With a ticket, the call waits in the admission queue and reaches the
+        executor only once the ticket is granted a slot.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future, False
+            future = Future()
+            self._calls[key] = future
+
+        def run():
+            try:
+                result = fn(*args)
+            except BaseException as e:
+                with self._lock:
+                    self._calls.pop(key, None)
+                future.set_exception(e)
+            else:
+                with self._lock:
+                    self._calls.pop(key, None)
+                future.set_result(result)
+
+        if ticket is not None:
+            ticket.submit(self._executor, run)
+        else:
+            self._executor.submit(run)
+        return future, True
+
+
+_executor = ThreadPoolExecutor(max_workers=settings.SURFACE_WORKERS, thread_name_prefix="surface")
+_flight = SingleFlight(_executor)
+_claim_lock = threading.Lock()
+
+
+# ─────────────────────────────────────
+# Completed-result cache
+# A result is fully determined by its request_id, so entries never go
+# stale; the cache only bounds how many are kept in memory (LRU).
+# ─────────────────────────────────────
+_results: "OrderedDict[str, dict]" = OrderedDict()
+_results_lock = threading.Lock()
+
+
+def _remember(request_id: str, result: dict) -> None:
+    with _results_lock:
+        _results[request_id] = result
+        _results.move_to_end(request_id)
+        while len(_results) > settings.SURFACE_CACHE_SIZE:
+            _results.popitem(last=False)
+
+
+def cached_result(request_id: str) -> Optional[dict]:
+    """Completed surface from the in-memory cache, if present."""
+    with _results_lock:
+        result = _results.get(request_id)
+        if result is not None:
+            _results.move_to_end(request_id)
+        return result
+
+
+def warm_cache() -> int:
+    """Load the most recently completed surfaces into the cache. Returns the count."""
+    recent = json_store.get_completed_scenario_surfaces(settings.SURFACE_CACHE_SIZE)
+    for request_id, result in reversed(recent):
+        _remember(request_id, result)
+    return len(recent)
+
+
+def _compute_and_store(request_id: str, request_data: dict, user_id: int) -> dict:
+    try:
+        result = evaluate_surface(request_data, settings.SURFACE_GRID_STEPS)
+        result["completed_at"] = time.time()
+    except ValueError as e:
+        result = {"status": "failed", "error": str(e), "request": request_data, "user_id": user_id}
+    json_store.save_scenario_surface(request_id, result)
+    if result["status"] == "completed":
+        _remember(request_id, result)
+    return result
+
+
+def submit(
+    request_id: str, request_data: dict, user_id: int, count: bool = True
+) -> Tuple[str, Optional[Future]]:
+    """
+    Start or join the computation for a scenario surface.
+
+    Identical requests share one computation: within this process they
+    attach to the in-flight Future, and across worker processes the
+    lease recorded by json_store.claim_scenario_surface keeps other
+    workers from starting a duplicate. Returns (status, future) where
+    future is None unless the computation runs in this process.
+    Polls pass count=False so they don't show up as coalesced requests.
+    Raises admission.AdmissionRejected when the computation can't be
+    admitted.
+    """
+    if cached_result(request_id) is not None:
+        if count:
+            metrics.increment("surface_requests_cached")
+        return "completed", None
+
+    with _claim_lock:
+        future = _flight.get(request_id)
+        if future is not None:
+            if count:
+                metrics.increment("surface_requests_coalesced")
+            return "pending", future
+
+        cost = grid_size(request_data)
+        state, record = json_store.claim_scenario_surface(
+            request_id, request_data, user_id, worker_id(), settings.SURFACE_LEASE_SECONDS
+        )
+        if state == "completed":
+            if count:
+                metrics.increment("surface_requests_cached")
+            return "completed", None
+        if state == "running":
+            if count:
+                metrics.increment("surface_requests_coalesced")
+            return "pending", None
+
+        # Only a request that will actually compute is charged; a rejected
+        # one gives its lease back so the next caller can claim it.
+        try:
+            ticket = admission.controller.admit(user_id, cost)
+        except (admission.AdmissionRejected, ValueError):
+            json_store.release_scenario_surface(request_id, worker_id())
+            raise
+
+        future, _ = _flight.submit(
+            request_id, _compute_and_store, request_id, request_data, user_id, ticket=ticket
+        )
+        metrics.increment("surface_requests_computed")
+        return "pending", future
@@ -0,0 +1,104 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app import json_store
+from app.admission import AdmissionController, AdmissionRejected
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _controller(clock=None, **overrides):
+    options = dict(max_running=1, max_queued=8, user_max_concurrent=4, user_budget=100, refill_seconds=10)
+    options.update(overrides)
+    return AdmissionController(clock=clock or FakeClock(), **options)
+
+
+def test_point_budget_sets_retry_after_and_refills():
+    clock = FakeClock()
+    controller = _controller(clock)
+    controller.admit(1, 80).cancel()
+    controller.admit(1, 80)
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.admit(1, 80)
+    assert rejected.value.retry_after == 6  # 60 points short at 10 points/s
+
+    clock.now = 6.0
+    controller.admit(1, 80)
+
+
+def test_per_user_concurrency_and_global_queue():
+    controller = _controller(max_queued=2, user_max_concurrent=2)
+    controller.admit(1, 1)
+    controller.admit(1, 1)
+    with pytest.raises(AdmissionRejected):
+        controller.admit(1, 1)
+
+    controller.admit(2, 1)
+    with pytest.raises(AdmissionRejected):
+        controller.admit(3, 1)
+
+
+def test_slots_are_shared_round_robin_across_users():
+    controller = _controller(max_running=1, clock=time.monotonic)
+    holder = controller.admit(0, 1)
+    holder.__enter__()
+
+    order = []
+    tickets = [(1, "a1"), (1, "a2"), (1, "a3"), (2, "b1")]
+    threads = []
+    for user_id, name in tickets:
+        ticket = controller.admit(user_id, 1)
+        thread = threading.Thread(target=ticket.run, args=(order.append, name))
+        thread.start()
+        threads.append(thread)
+        # Wait until the ticket is queued so the arrival order is fixed
+        while sum(len(q) for q in controller._waiting.values()) < len(threads):
+            time.sleep(0.001)
+
+    holder.__exit__(None, None, None)
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert order == ["a1", "b1", "a2", "a3"]
+
+
+def test_submitted_work_reaches_the_executor_in_round_robin_order():
+    controller = _controller(max_running=1, clock=time.monotonic)
+    holder = controller.admit(0, 1)
+    holder.__enter__()
+
+    order = []
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        futures = [
+            controller.admit(user_id, 1).submit(executor, order.append, name)
+            for user_id, name in [(1, "a1"), (1, "a2"), (1, "a3"), (2, "b1")]
+        ]
+        holder.__exit__(None, None, None)
+        for future in futures:
+            future.result(timeout=5)
+
+    assert order == ["a1", "b1", "a2", "a3"]
+    assert controller._admitted == 0
+
+
+def test_point_budget_is_shared_between_worker_processes(tmp_path, monkeypatch):
+    monkeypatch.setattr(json_store, "ADMISSION_BUCKETS_FILE", str(tmp_path / "admission_buckets.json"))
+    clock = FakeClock()
+    first, second = (_controller(clock, buckets=json_store.admission_buckets) for _ in range(2))
+
+    ticket = first.admit(1, 80)
+    with pytest.raises(AdmissionRejected):
+        second.admit(1, 80)
+
+    ticket.cancel()
+    second.admit(1, 80)
@@ -0,0 +1,70 @@
+import json
+import os
+
+from app import json_store
+from app.portfolio_analytics import PortfolioView
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), "..", "..", "..", "data", "credit_ratings.json")
+
+
+def _demo_records():
+    with open(DATA_FILE) as f:
+        return json.load(f)["users"]["1"]
+
+
+def test_incremental_matches_rebuild():
+    records = _demo_records()
+    view = PortfolioView(records[:3])
+    for record in records[3:]:
+        view.add(record)
+
+    view.update(records[0]["id"], dict(records[0], revenue=99000000, creditRating="BBB"))
+    view.remove(records[1]["id"])
+    view.remove(records[-1]["id"])
+
+    expected = [dict(records[0], revenue=99000000, creditRating="BBB")] + records[2:-1]
+    rebuilt = PortfolioView(expected).snapshot()
+    incremental = view.snapshot()
+
+    assert incremental["total"] == len(expected)
+    assert incremental["ratingDistribution"] == rebuilt["ratingDistribution"]
+    assert incremental["countsByMonth"] == rebuilt["countsByMonth"]
+    for metric, value in rebuilt["revenueWeightedAverages"].items():
+        assert abs(incremental["revenueWeightedAverages"][metric] - value) < 1e-9
+
+
+def test_missing_values_are_skipped():
+    view = PortfolioView([{"id": "A", "revenue": 10.0, "ebitdaMargin": 20.0}, {"id": "B", "ebitdaMargin": 5.0}])
+    snapshot = view.snapshot()
+    assert snapshot["revenueWeightedAverages"]["ebitdaMargin"] == 20.0
+    assert snapshot["revenueWeightedAverages"]["debtToEbitda"] is None
+    assert snapshot["ratingDistribution"] == {"Unrated": 2}
+
+
+def test_update_with_new_id_rekeys_the_row():
+    records = _demo_records()
+    view = PortfolioView(records)
+    view.update(records[0]["id"], dict(records[0], id="CR-RENAMED"))
+    view.remove("CR-RENAMED")
+    view.remove(records[0]["id"])
+
+    assert view.snapshot()["total"] == len(records) - 1
+    assert sorted(view.features()[0]) == sorted(r["id"] for r in records[1:])
+
+
+def test_store_view_follows_renames_and_other_writers(tmp_path, monkeypatch):
+    portfolio_file = tmp_path / "credit_ratings.json"
+    monkeypatch.setattr(json_store, "PORTFOLIO_FILE", str(portfolio_file))
+    monkeypatch.setattr(json_store, "PORTFOLIO_VERSIONS_FILE", str(tmp_path / "versions.json"))
+    monkeypatch.setattr(json_store, "_portfolio_views", {})
+    records = _demo_records()
+    portfolio_file.write_text(json.dumps({"users": {"1": records}}))
+
+    assert json_store.get_portfolio_view(1).snapshot()["total"] == len(records)
+    json_store.update_credit_rating(1, records[0]["id"], {"id": "CR-RENAMED"})
+    json_store.delete_credit_rating(1, "CR-RENAMED")
+    assert json_store.get_portfolio_view(1).snapshot()["total"] == len(records) - 1
+
+    # Another worker process rewrites the file
+    portfolio_file.write_text(json.dumps({"users": {"1": records[:2]}}))
+    assert json_store.get_portfolio_view(1).snapshot()["total"] == 2
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from app import rating_model
+
+RECORD = {
+    "id": "CR-TEST-001",
+    "revenue": 45200000,
+    "ebitdaMargin": 23.5,
+    "fcfToDebt": 0.42,
+    "debtToEbitda": 3.2,
+    "netDebtToEbitda": 2.8,
+    "ebitdaToInterest": 4.5,
+    "roce": 18.3,
+    "interestCoverage": 4.5,
+    "creditRating": "BB+",
+}
+
+
+def test_thresholds_bracket_the_adjacent_notches():
+    [result] = rating_model.solve_thresholds([RECORD])
+    current = rating_model.RATING_SCALE.index(result["modelRating"])
+
+    for metric, entry in result["thresholds"].items():
+        for label, step in (("upgrade", 1), ("downgrade", -1)):
+            side = entry[label]
+            if side is None:
+                continue
+            assert side["rating"] == rating_model.RATING_SCALE[current + step]
+
+            # Just past the threshold the model gives the adjacent notch,
+            # just short of it the rating is unchanged.
+            delta = (side["value"] - entry["value"]) * 1e-6
+            past = dict(RECORD, **{metric: side["value"] + delta})
+            short = dict(RECORD, **{metric: side["value"] - delta})
+            assert rating_model.rate_records([past]) == [side["rating"]]
+            assert rating_model.rate_records([short]) == [result["modelRating"]]
+
+
+def test_unreachable_threshold_is_none():
+    # Interest cover already at the floor of its scale cannot push a downgrade
+    record = dict(RECORD, ebitdaToInterest=1.0)
+    [result] = rating_model.solve_thresholds([record], metrics=["ebitdaToInterest"])
+    assert result["thresholds"]["ebitdaToInterest"]["downgrade"] is None
+
+
+def test_rate_is_vectorized_and_monotone():
+    X = np.tile(rating_model.features_from_records([RECORD]), (50, 1))
+    X[:, rating_model.METRICS.index("debtToEbitda")] = np.linspace(0.5, 8.0, 50)
+    notches = rating_model.rate(X)
+    assert np.all(np.diff(notches) <= 0)
+
+
+def test_incomplete_records_are_skipped():
+    incomplete = {k: v for k, v in RECORD.items() if k != "roce"}
+    complete, skipped = rating_model.solve_thresholds([RECORD, dict(incomplete, id="CR-TEST-002")])
+    assert complete["skipped"] is None and complete["thresholds"]
+    assert skipped["skipped"] == "missing or non-numeric 'roce'"
+    assert skipped["thresholds"] is None
+
+
+def test_metrics_must_be_a_list():
+    with pytest.raises(ValueError):
+        rating_model.solve_thresholds([RECORD], metrics="revenue")
+    with pytest.raises(ValueError):
+        rating_model.solve_thresholds([RECORD], metrics=[])
+    with pytest.raises(ValueError):
+        rating_model.solve_thresholds([RECORD], metrics=[["revenue"]])
+
+
+def test_tolerance_has_a_floor():
+    with pytest.raises(ValueError):
+        rating_model.solver_options(None, 5e-324)
+    assert rating_model.solver_options(None, rating_model.MIN_TOLERANCE)[1] == rating_model.MIN_TOLERANCE
@@ -0,0 +1,50 @@
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from app import stress_engine
+from app.portfolio_analytics import PortfolioView
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), "..", "..", "..", "data", "credit_ratings.json")
+
+
+def _portfolio():
+    with open(DATA_FILE) as f:
+        records = json.load(f)["users"]["1"]
+    return PortfolioView(records).features()
+
+
+def test_result_is_independent_of_worker_count():
+    ids, X = _portfolio()
+    params = stress_engine.parse_params({"paths": 500, "seed": 7}, max_paths=1000)
+    chunk_bytes = 50 * len(ids) * stress_engine._BYTES_PER_NAME_PATH  # 50 paths per chunk
+
+    serial = list(stress_engine.run_stress(ids, X, params, chunk_bytes=chunk_bytes))
+    with ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context("spawn")) as pool:
+        pooled = list(stress_engine.run_stress(ids, X, params, chunk_bytes=chunk_bytes, pool=pool, max_workers=2))
+
+    assert len(serial) == 11  # 10 partials + final
+    assert [u["pathsCompleted"] for u in serial[:-1]] == list(range(50, 501, 50))
+    assert serial[-1] == pooled[-1]
+
+    final = serial[-1]
+    assert final["done"]
+    assert sum(map(sum, final["migrationMatrix"])) == 500 * len(ids)
+    assert sum(final["downgradeCountDistribution"].values()) == 500
+
+
+@pytest.mark.parametrize("body", [
+    {"correlation": [[1, 2, 0], [2, 1, 0], [0, 0, 1]]},
+    {"correlation": [[1, 0.9, 0], [0, 1, 0], [0, 0, 1]]},
+    {"correlation": [[2, 0, 0], [0, 2, 0], [0, 0, 2]]},
+    {"volatilities": [0.1, 0.2, 0.3]},
+    {"volatilities": {"revenue": float("nan")}},
+    {"seed": -1},
+    {"seed": 1.5},
+])
+def test_rejects_invalid_params(body):
+    with pytest.raises(ValueError):
+        stress_engine.parse_params(body, max_paths=10)
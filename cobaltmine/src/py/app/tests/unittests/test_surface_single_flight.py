@@ -0,0 +1,106 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import admission, json_store, main, metrics, surface_engine
+from app.auth import get_current_user
+
+REQUEST = {
+    "computationId": "CR-2024-001",
+    "revenue": 45200000, "revenue_lower": 40000000, "revenue_upper": 60000000,
+    "ebitdaMargin": 23.5, "fcfToDebt": 0.42, "debtToEbitda": 3.2, "netDebtToEbitda": 2.8,
+    "ebitdaToInterest": 4.5, "roce": 18.3, "interestCoverage": 4.5,
+}
+
+
+def test_concurrent_identical_submits_evaluate_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(json_store, "SCENARIO_SURFACES_FILE", str(tmp_path / "scenario_surfaces.json"))
+
+    evaluations = []
+    real_evaluate = surface_engine.evaluate_surface
+
+    def slow_evaluate(request_data, steps):
+        evaluations.append(request_data)
+        time.sleep(0.2)
+        return real_evaluate(request_data, steps)
+
+    monkeypatch.setattr(surface_engine, "evaluate_surface", slow_evaluate)
+
+    before = metrics.snapshot()["counters"]
+    n = 16
+    barrier = threading.Barrier(n)
+
+    def submit(user_id):
+        barrier.wait()
+        return surface_engine.submit("same-request", dict(REQUEST), user_id)
+
+    with ThreadPoolExecutor(max_workers=n) as pool:
+        submissions = list(pool.map(submit, range(n)))
+
+    futures = [future for _, future in submissions]
+    assert all(future is futures[0] for future in futures)
+    results = [future.result(timeout=5) for future in futures]
+
+    assert len(evaluations) == 1
+    assert all(result == results[0] for result in results)
+    assert results[0]["status"] == "completed"
+    assert json_store.get_scenario_surface("same-request") == results[0]
+
+    after = metrics.snapshot()["counters"]
+    assert after["surface_requests_computed"] - before.get("surface_requests_computed", 0) == 1
+    assert after["surface_requests_coalesced"] - before.get("surface_requests_coalesced", 0) == n - 1
+
+    # Once stored, further submits are served from the completed record
+    assert surface_engine.submit("same-request", dict(REQUEST), 0) == ("completed", None)
+    assert len(evaluations) == 1
+
+
+def test_lease_held_by_another_worker_is_joined(tmp_path, monkeypatch):
+    monkeypatch.setattr(json_store, "SCENARIO_SURFACES_FILE", str(tmp_path / "scenario_surfaces.json"))
+    json_store.claim_scenario_surface("remote", REQUEST, 1, "other-host:1", lease_seconds=60)
+
+    assert surface_engine.submit("remote", dict(REQUEST), 2) == ("pending", None)
+
+
+def test_poll_returns_pending_while_computation_runs(tmp_path, monkeypatch):
+    monkeypatch.setattr(json_store, "SCENARIO_SURFACES_FILE", str(tmp_path / "scenario_surfaces.json"))
+    monkeypatch.setattr(main.settings, "SURFACE_POLL_WAIT_SECONDS", 0.05)
+    monkeypatch.setitem(main.app.dependency_overrides, get_current_user, lambda: type("User", (), {"id": 1})())
+
+    release = threading.Event()
+    real_evaluate = surface_engine.evaluate_surface
+
+    def blocked_evaluate(request_data, steps):
+        release.wait(timeout=5)
+        return real_evaluate(request_data, steps)
+
+    monkeypatch.setattr(surface_engine, "evaluate_surface", blocked_evaluate)
+
+    client = TestClient(main.app)
+    response_id = client.post("/api/scenario-surface/request", json=dict(REQUEST, roce=19.0)).json()["scenarioSurfaceResponseId"]
+    assert client.get(f"/api/scenario-surface/response/{response_id}").json() == {"status": "pending"}
+
+    release.set()
+    _, future = surface_engine.submit(response_id, dict(REQUEST, roce=19.0), 1, count=False)
+    if future is not None:
+        future.result(timeout=5)
+    assert client.get(f"/api/scenario-surface/response/{response_id}").json()["status"] == "completed"
+
+
+def test_admission_only_applies_to_requests_that_compute(tmp_path, monkeypatch):
+    monkeypatch.setattr(json_store, "SCENARIO_SURFACES_FILE", str(tmp_path / "scenario_surfaces.json"))
+    controller = admission.AdmissionController(
+        max_running=1, max_queued=1, user_max_concurrent=1, user_budget=10 ** 9, refill_seconds=1
+    )
+    monkeypatch.setattr(admission, "controller", controller)
+    controller.admit(7, 1)  # user 7 is at their concurrency limit
+
+    json_store.save_scenario_surface("done", {"status": "completed", "timeseries": {}})
+    assert surface_engine.submit("done", dict(REQUEST), 7) == ("completed", None)
+
+    with pytest.raises(admission.AdmissionRejected):
+        surface_engine.submit("new", dict(REQUEST), 7)
+    assert json_store.get_scenario_surface("new") is None
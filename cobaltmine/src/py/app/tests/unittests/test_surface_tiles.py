@@ -0,0 +1,90 @@
+import pytest
+
+from app import metrics, surface_engine
+from app.rating_model import rate_records
+
+BASE = {
+    "computationId": "CR-2024-001",
+    "revenue": 45200000, "ebitdaMargin": 23.5, "fcfToDebt": 0.42, "debtToEbitda": 3.2,
+    "netDebtToEbitda": 2.8, "ebitdaToInterest": 4.5, "roce": 18.3, "interestCoverage": 4.5,
+}
+SWEEP = dict(BASE, revenue_lower=40000000, revenue_upper=60000000, ebitdaMargin_lower=15, ebitdaMargin_upper=30)
+
+
+def _counters():
+    counters = metrics.snapshot()["counters"]
+    return counters.get("surface_tiles_hit", 0), counters.get("surface_tiles_computed", 0)
+
+
+def test_equivalent_requests_share_a_key():
+    equivalent = {k: v for k, v in SWEEP.items() if not k.startswith("ebitdaMargin")}
+    equivalent.update({
+        "computationId": "CR-2024-999",
+        "revenue_lower": 40000001,
+        "ebitda_margin": 23.5,
+        "EBITDA_Margin_upper": 30.01,
+        "ebitda_margin_lower": 15,
+    })
+    assert surface_engine.request_key(equivalent) == surface_engine.request_key(SWEEP)
+    assert surface_engine.request_key(dict(SWEEP, roce=20.0)) != surface_engine.request_key(SWEEP)
+
+
+def test_sub_range_is_assembled_from_cached_tiles():
+    full = surface_engine.evaluate_surface(SWEEP, 10)
+    hit, computed = _counters()
+
+    sub = dict(SWEEP, revenue_lower=42000000, revenue_upper=58000000)
+    partial = surface_engine.evaluate_surface(sub, 10)
+    assert _counters()[1] == computed
+    assert _counters()[0] > hit
+
+    full_points = {tuple(p[:2]): p[2] for p in full["timeseries"].values()}
+    for point in partial["timeseries"].values():
+        assert full_points[tuple(point[:2])] == point[2]
+
+
+def test_zoomed_in_grid_reuses_the_coarser_points():
+    sweep = dict(SWEEP, roce=21.0)  # fresh lattice, not shared with other tests
+    surface_engine.evaluate_surface(sweep, 10)
+    before = metrics.snapshot()["counters"]
+
+    zoomed = dict(sweep, revenue_lower=45000000, revenue_upper=55000000)
+    result = surface_engine.evaluate_surface(zoomed, 10)
+    after = metrics.snapshot()["counters"]
+    reused = after["surface_points_reused"] - before.get("surface_points_reused", 0)
+    computed = after["surface_points_computed"] - before.get("surface_points_computed", 0)
+
+    assert result["grid"]["revenue"]["step"] < 45000000 / 10  # finer than the first sweep
+    assert reused > 0 and computed > 0
+    for revenue, margin, rating in result["timeseries"].values():
+        assert rate_records([dict(BASE, revenue=revenue, ebitdaMargin=margin, roce=21.0)]) == [rating]
+
+
+def test_assembled_surface_matches_the_model():
+    result = surface_engine.evaluate_surface(dict(SWEEP, roce_lower=5, roce_upper=30), 6)
+    assert result["plot_type"] == "3D"
+    for revenue, margin, roce, rating in result["timeseries"].values():
+        record = dict(BASE, revenue=revenue, ebitdaMargin=margin, roce=roce)
+        assert rate_records([record]) == [rating]
+
+
+def test_grid_covers_the_requested_bounds():
+    for steps in (6, 10, 25):
+        result = surface_engine.evaluate_surface(dict(BASE, revenue_lower=10000000, revenue_upper=100000000), steps)
+        revenues = [point[0] for point in result["timeseries"].values()]
+        assert min(revenues) <= 10000000 and max(revenues) >= 100000000
+        assert steps / 2 <= result["grid"]["revenue"]["points"] <= steps + 1
+
+
+def test_non_finite_values_are_rejected():
+    with pytest.raises(ValueError):
+        surface_engine.request_key(dict(SWEEP, revenue_upper=float("inf")))
+    with pytest.raises(ValueError):
+        surface_engine.request_key(dict(SWEEP, roce=float("nan")))
+
+
+def test_range_below_the_resolution_is_rejected():
+    with pytest.raises(ValueError):
+        surface_engine.request_key(dict(BASE, revenue_lower=10, revenue_upper=20))
+    single_point = surface_engine.evaluate_surface(dict(BASE, revenue_lower=45000000, revenue_upper=45000000), 10)
+    assert [p[0] for p in single_point["timeseries"].values()] == [45000000.0]
@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+from app import json_store, versioning
+
+
+def _apply_updates(history, record, updates, **settings):
+    options = dict(checkpoint_interval=4, max_versions=100, retention_days=0)
+    options.update(settings)
+    states = [dict(record)]
+    for fields in updates:
+        before = dict(record)
+        record = dict(record, **fields)
+        versioning.record_change(history, before, record, **options)
+        if record != before:
+            states.append(dict(record))
+    return states
+
+
+def test_every_version_is_reconstructed():
+    history = {}
+    updates = [{"revenue": 100 + i} if i % 3 else {"roce": float(i)} for i in range(12)]
+    states = _apply_updates(history, {"id": "S-1", "revenue": 100, "roce": 1.0}, updates)
+
+    for version, state in enumerate(states, start=1):
+        assert versioning.reconstruct(history, version) == state
+
+    types = [entry["type"] for entry in history["versions"]]
+    assert types[0] == "checkpoint" and types[4] == "checkpoint" and types[1] == "delta"
+    assert history["versions"][1] == {**history["versions"][1], "set": {"roce": 0.0}, "unset": []}
+
+
+def test_noop_update_adds_no_version():
+    history = {}
+    _apply_updates(history, {"id": "S-1", "revenue": 100}, [{"revenue": 100}])
+    assert history["versions"] == []
+
+
+def test_pruning_keeps_latest_versions_reconstructable():
+    history = {}
+    updates = [{"revenue": 100 + i} for i in range(1, 10)]
+    states = _apply_updates(history, {"id": "S-1", "revenue": 100}, updates, max_versions=5)
+
+    versions = history["versions"]
+    assert len(versions) == 5
+    assert versions[0]["type"] == "checkpoint"
+    assert versioning.reconstruct(history, 1) is None
+    for version in range(6, 11):
+        assert versioning.reconstruct(history, version) == states[version - 1]
+
+
+def test_age_limit_keeps_recent_versions():
+    history = {}
+    states = _apply_updates(history, {"id": "S-1", "roce": 1.0}, [{"roce": 2.0}, {"roce": 3.0}], retention_days=30)
+    assert [v["version"] for v in history["versions"]] == [1, 2, 3]
+    for version, state in enumerate(states, start=1):
+        assert versioning.reconstruct(history, version) == state
+
+    # Backdate the first two versions past the cutoff; only they are dropped
+    for entry in history["versions"][:2]:
+        entry["timestamp"] = "2000-01-01T00:00:00"
+    versioning.prune(history, max_versions=100, retention_days=30)
+    assert [v["version"] for v in history["versions"]] == [3]
+    assert versioning.reconstruct(history, 3) == states[2]
+
+
+def test_history_follows_a_renamed_record(tmp_path, monkeypatch):
+    scenarios_file = tmp_path / "scenarios.json"
+    monkeypatch.setattr(json_store, "SCENARIOS_FILE", str(scenarios_file))
+    monkeypatch.setattr(json_store, "SCENARIO_VERSIONS_FILE", str(tmp_path / "scenario_versions.json"))
+    scenarios_file.write_text(json.dumps({"users": {"1": [{"id": "S-1", "roce": 1.0}, {"id": "S-2"}]}}))
+
+    json_store.update_scenario(1, "S-1", {"roce": 2.0})
+    json_store.update_scenario(1, "S-1", {"id": "S-RENAMED"})
+
+    assert [v["version"] for v in json_store.get_scenario_versions(1, "S-RENAMED")] == [1, 2, 3]
+    assert json_store.get_scenario_version(1, "S-RENAMED", 1) == {"id": "S-1", "roce": 1.0}
+    with pytest.raises(ValueError):
+        json_store.update_scenario(1, "S-RENAMED", {"id": "S-2"})
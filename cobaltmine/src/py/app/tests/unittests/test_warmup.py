@@ -0,0 +1,56 @@
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from app import json_store, main, rating_model, surface_engine, warmup
+
+
+def _wait_for_ready(client):
+    for _ in range(200):
+        response = client.get("/api/ready")
+        if response.status_code == 200:
+            return response
+        time.sleep(0.01)
+    raise AssertionError("worker never became ready")
+
+
+def test_ready_only_after_warm_up(tmp_path, monkeypatch):
+    monkeypatch.setattr(json_store, "SCENARIO_SURFACES_FILE", str(tmp_path / "scenario_surfaces.json"))
+    monkeypatch.setattr(warmup, "state", warmup.WarmupState())
+    release = threading.Event()
+    real_warm_cache = surface_engine.warm_cache
+
+    def blocked_warm_cache():
+        release.wait(timeout=5)
+        return real_warm_cache()
+
+    monkeypatch.setattr(surface_engine, "warm_cache", blocked_warm_cache)
+
+    with TestClient(main.app) as client:
+        response = client.get("/api/ready")
+        assert response.status_code == 503
+        assert response.json()["status"] == "warming"
+
+        release.set()
+        body = _wait_for_ready(client).json()
+        assert body["status"] == "ready"
+        assert body["startupSeconds"] >= body["phases"]["imports"] > 0
+        assert set(body["phases"]) == {"imports", "database", "portfolio_views", "rating_model", "surfaces"}
+
+
+def test_failing_phase_reports_failed(monkeypatch):
+    monkeypatch.setattr(warmup, "state", warmup.WarmupState())
+    monkeypatch.setattr(json_store, "preload_portfolio_views", lambda: 0)
+
+    def broken():
+        raise RuntimeError("model unavailable")
+
+    monkeypatch.setattr(rating_model, "warm_up", broken)
+    warmup.mark_imports_done(time.monotonic())
+    warmup.run()
+
+    response = TestClient(main.app).get("/api/ready")
+    assert response.status_code == 503
+    assert response.json()["status"] == "failed"
+    assert response.json()["error"] == "model unavailable"
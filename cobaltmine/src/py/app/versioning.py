@@ -0,0 +1,149 @@
+import copy
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+# ─────────────────────────────────────
+# Per-record version history
+# A history is {"versions": [entry, ...]} with contiguous version numbers.
+# Each entry is either a full checkpoint:
+#     {"version": n, "timestamp": ..., "type": "checkpoint", "record": {...}}
+# or the field-level change from the previous version:
+#     {"version": n, "timestamp": ..., "type": "delta", "set": {...}, "unset": [...]}
+# The oldest retained entry is always a checkpoint, and a checkpoint is
+# written every `checkpoint_interval` versions, so rebuilding any version
+# applies at most checkpoint_interval - 1 deltas.
+# ─────────────────────────────────────
+
+
+def diff(old: dict, new: dict) -> dict:
+    """Field-level delta turning old into new."""
+    return {
+        "set": {k: copy.deepcopy(v) for k, v in new.items() if k not in old or old[k] != v},
+        "unset": [k for k in old if k not in new],
+    }
+
+
+def apply_delta(record: dict, delta: dict) -> dict:
+    """New record with a delta applied."""
+    result = dict(record)
+    result.update(copy.deepcopy(delta["set"]))
+    for key in delta["unset"]:
+        result.pop(key, None)
+    return result
+
+
+def _checkpoint(version: int, timestamp: Optional[str], record: dict) -> dict:
+    return {"version": version, "timestamp": timestamp, "type": "checkpoint", "record": copy.deepcopy(record)}
+
+
+def reconstruct(history: dict, version: int) -> Optional[dict]:
+    """Record as of `version`, or None if that version isn't retained."""
+    versions = history.get("versions", [])
+    if not versions:
+        return None
+    index = version - versions[0]["version"]
+    if not 0 <= index < len(versions):
+        return None
+
+    start = index
+    while versions[start]["type"] != "checkpoint":
+        start -= 1
+    record = copy.deepcopy(versions[start]["record"])
+    for entry in versions[start + 1:index + 1]:
+        record = apply_delta(record, entry)
+    return record
+
+
+def record_change(
+    history: dict,
+    before: dict,
+    after: dict,
+    checkpoint_interval: int,
+    max_versions: int,
+    retention_days: int,
+) -> bool:
+    """
+    Append a version for a change from `before` to `after`.
+    Returns False when nothing was recorded. The first change also stores
+    `before` as version 1, and an out-of-band edit since the last
+    recorded version is captured as its own version first.
+    """
+    versions = history.setdefault("versions", [])
+    now = datetime.utcnow().isoformat()
+
+    if not versions:
+        if not _append_first(history, before, after, now, checkpoint_interval):
+            return False
+    else:
+        drifted = _append(history, reconstruct(history, versions[-1]["version"]), before, now, checkpoint_interval)
+        if not _append(history, before, after, now, checkpoint_interval) and not drifted:
+            return False
+
+    prune(history, max_versions, retention_days)
+    return True
+
+
+def _append_first(history: dict, before: dict, after: dict, timestamp: str, checkpoint_interval: int) -> bool:
+    """
+    Start a history with `before` as version 1, if there is a change to
+    record. Version 1 is stamped with the time it was captured, so age-based
+    pruning keeps it as long as the change that follows it.
+    """
+    history["versions"].append(_checkpoint(1, timestamp, before))
+    if _append(history, before, after, timestamp, checkpoint_interval):
+        return True
+    history["versions"].clear()
+    return False
+
+
+def _append(history: dict, previous: dict, current: dict, timestamp: str, checkpoint_interval: int) -> bool:
+    delta = diff(previous, current)
+    if not delta["set"] and not delta["unset"]:
+        return False
+    versions = history["versions"]
+    version = versions[-1]["version"] + 1
+    if (version - 1) % checkpoint_interval == 0:
+        versions.append(_checkpoint(version, timestamp, current))
+    else:
+        versions.append({"version": version, "timestamp": timestamp, "type": "delta", **delta})
+    return True
+
+
+def prune(history: dict, max_versions: int, retention_days: int) -> None:
+    """
+    Drop the oldest versions beyond max_versions or older than
+    retention_days (0 disables the age limit). The latest version is
+    always kept, and the new oldest version is rewritten as a checkpoint.
+    A version without a timestamp is never considered expired.
+    """
+    versions = history.get("versions", [])
+    cutoff = None
+    if retention_days > 0:
+        cutoff = (datetime.utcnow() - timedelta(days=retention_days)).isoformat()
+
+    drop = max(0, len(versions) - max_versions)
+    while (
+        cutoff
+        and drop < len(versions) - 1
+        and versions[drop]["timestamp"] is not None
+        and versions[drop]["timestamp"] < cutoff
+    ):
+        drop += 1
+    if not drop:
+        return
+
+    first = versions[drop]
+    if first["type"] != "checkpoint":
+        first = _checkpoint(first["version"], first["timestamp"], reconstruct(history, first["version"]))
+    history["versions"] = [first] + versions[drop + 1:]
+
+
+def summarize(history: dict) -> List[dict]:
+    """Version list without record bodies."""
+    summary = []
+    for entry in history.get("versions", []):
+        item = {"version": entry["version"], "timestamp": entry["timestamp"], "type": entry["type"]}
+        if entry["type"] == "delta":
+            item["changedFields"] = sorted(list(entry["set"]) + entry["unset"])
+        summary.append(item)
+    return summary
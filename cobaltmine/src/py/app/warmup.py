@@ -0,0 +1,81 @@
+import logging
+import time
+from typing import Callable, Dict, Optional
+
+from app import json_store, metrics, rating_model, surface_engine
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class WarmupState:
+    """Readiness of this worker, reported by /api/ready."""
+
+    def __init__(self):
+        self.ready = False
+        self.started_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self.phases: Dict[str, float] = {}
+        self.details: Dict[str, object] = {}
+        self.startup_seconds: Optional[float] = None
+
+    def as_dict(self) -> dict:
+        if self.ready:
+            status = "ready"
+        elif self.error:
+            status = "failed"
+        else:
+            status = "warming"
+        return {
+            "status": status,
+            "error": self.error,
+            "startupSeconds": self.startup_seconds,
+            "phases": dict(self.phases),
+            "details": dict(self.details),
+        }
+
+
+state = WarmupState()
+
+
+def timed(name: str, fn: Callable):
+    """Run one startup phase, recording its duration in the state and metrics."""
+    started = time.monotonic()
+    result = fn()
+    elapsed = time.monotonic() - started
+    state.phases[name] = elapsed
+    metrics.set_gauge(f"startup_{name}_seconds", elapsed)
+    logger.info("Startup phase %s took %.3fs", name, elapsed)
+    return result
+
+
+def mark_imports_done(started_at: float) -> None:
+    """
+    Record the time from `started_at` (a time.monotonic() value taken
+    before app.main imports anything) to the start of the lifespan.
+    """
+    state.started_at = started_at
+    state.phases["imports"] = time.monotonic() - started_at
+    metrics.set_gauge("startup_imports_seconds", state.phases["imports"])
+    metrics.set_gauge("ready", 0)
+
+
+def run() -> None:
+    """
+    Build the portfolio analytics views, precompute the rating model's code
+    paths and load the hot set of completed surfaces, then mark the worker
+    ready.
+    """
+    try:
+        state.details["credit_ratings"] = timed("portfolio_views", json_store.preload_portfolio_views)
+        timed("rating_model", rating_model.warm_up)
+        state.details["cached_surfaces"] = timed("surfaces", surface_engine.warm_cache)
+    except Exception as e:
+        state.error = str(e)
+        logger.exception("Warm-up failed")
+        return
+
+    state.startup_seconds = time.monotonic() - state.started_at
+    state.ready = True
+    metrics.set_gauge("startup_seconds", state.startup_seconds)
+    metrics.set_gauge("ready", 1)
+    logger.info("Worker ready after %.3fs", state.startup_seconds)